@@ -13,6 +13,8 @@ If assemble=False, return the part so that it can be 3D-printed from z=0 upwards
                    The printer bed is the xy-plane.
 If assemble=True, return the part so that the optical axis is at z=0, with laser light traveling downwards
                   The table (or the RPi camera) is the xy plane
+If the assembled part is just the printable part moved to its place, decorate the function with
+@parts.printable_part(transform) instead of building it twice.
 """
 
 from solid.utils import *  # pip install Solidpython
@@ -20,11 +22,11 @@ from solid import *  # pip install Solidpython
 import numpy
 
 from base import owis_holes, base, sunk_hole, base_rods30
-from file_tools import safe_mkdir
 from helpers import rounded_plate
-from render_stl import render_scad_dir_to_stl_dir
+from parts import printable_part
 
 
+@printable_part()
 def rpi_cam_mount(assemble=False):
     # https://www.raspberrypi.org/documentation/hardware/camera/mechanical/rpi_MECH_Camera2_2p1.pdf
     # 2016-11-30: printed; works. but: needs 4 spacers to keep the smd components on the back of the camera from touching the plate.
@@ -202,28 +204,19 @@ def tube_with_rodmount():
     return mount
 
 
-if __name__ == "__main__":
-
-    _fine = True
-    render_STL = False
-
-    if _fine:
-        header = "$fa = 5;"  # minimum face angle
-        header += "$fs = 0.1;"  # minimum face size
-    else:
-        header = ""
+def sweeps():
+    """the parts built by the __main__ block, as sweep.Sweep (also benchmarked, see benchmark.py)"""
+    from sweep import Sweep
 
-    safe_mkdir("scad/misc")
+    return [Sweep(slide_holder, {}, name="slide-holder", assemble=False),
+            Sweep(slide_holder, {}, name="slide-holder-assembled", assemble=True),
+            Sweep(slide_holder, {}, name="beamsplitter-holder", assemble=False, angle_deg=45),
+            Sweep(rpi_cam_mount, {}, name="RPi-Cam")]
 
-    scad_render_to_file(slide_holder(False), "scad/misc/slide-holder.scad", file_header=header)
-    scad_render_to_file(slide_holder(True), "scad/misc/slide-holder-assembled.scad", file_header=header)
-    scad_render_to_file(slide_holder(False, 45), "scad/misc/beamsplitter-holder.scad", file_header=header)
-
-    scad_render_to_file(rpi_cam_mount(), "scad/misc/RPi-Cam.scad", file_header=header)
-
-    if render_STL:
-        safe_mkdir("stl")
-        render_scad_dir_to_stl_dir("scad/misc", "stl")
 
+if __name__ == "__main__":
+    from sweep import build_sweeps
 
+    render_STL = False
 
+    build_sweeps(sweeps(), "scad/misc", "stl", render=render_STL, manifest_name="Holmos_manifest.json")
@@ -7,38 +7,31 @@ Created on 09.01.2019
 Base to be added to the upper parts.
 Upper parts are expected to be x,y = 40x40mm², i.e. the base starts at z=0, y=-20 and is symmetric in +-x
 
-"global_settings.ini" controls which type of base is used for all parts.
+"global_settings.ini" controls which type of base is used for all parts, see config.
 """
 
-import configparser
 import warnings
 
 import numpy
 from solid import *
 from solid import translate, rotate, cylinder, cube
 
+from config import current_config
 from file_tools import safe_mkdir
 from helpers import rounded_plate, cyl_arc
-
-__config = configparser.ConfigParser()
-__config.read("global_settings.ini")
-__threads20 = __config.getboolean("mount", "Threads20mm")
-__rods30 = __config.getboolean("mount", "Rods6mmBy30mm")
-__rods30_tightness = __config.getfloat("mount", "Rods6mm_tightness")
+from resolution import scad_header, segments
+from subpart_cache import prerendered
 
 rods30_dist_third_rod = 60  # distance of third rod behind two main rods (orthogonal distance)
 rods30_diag_third_rod = (15**2 + rods30_dist_third_rod**2)**.5
 
-if __rods30 and __threads20:
-    print("bad configuration")
-    exit()
-
 
 def base(**kwargs):
-    if __threads20:
+    config = current_config().validate()
+    if config.threads20:
         return base_threads20()
 
-    if __rods30:
+    if config.rods30:
         return base_rods30(**kwargs)
 
     warnings.warn("No base configured, printed parts may be difficult to mount")
@@ -48,6 +41,7 @@ def base_threads20():
     return hole()(owis_holes(True))
 
 
+@prerendered
 def base_rods30(rod_sep=30, z_length=10):
     """base for attaching to two parallel rods of 6mm diameter set 30mm apart."""
     mount_height = 10  # height (y) of mount
@@ -67,10 +61,13 @@ def base_rods30(rod_sep=30, z_length=10):
     return base
 
 
-def single_rod_clamp(z_length=10, tightness=__rods30_tightness):
+@prerendered
+def single_rod_clamp(z_length=10, tightness=None):
     """single clamp to attach to a z-tube.
     The tube is at xy = (0,5), so that this clamp attaches to things at y=0...height
-    :param tightness: diameter reduction of clamp. larger values give tighter fit."""
+    :param tightness: diameter reduction of clamp. larger values give tighter fit. Default: Rods6mm_tightness"""
+    if tightness is None:
+        tightness = current_config().rods30_tightness
 
     diam_hole = 6 - tightness
     clamp_diff = .5  # how much smaller is the clamp, i.e. how far does it need to bend?
@@ -110,8 +107,8 @@ def sunk_hole(r=1, length=10):
     :param length:
     :return:
     """
-    hole = translate([0, 0, length/2])(cylinder(r, h=length, center=True))
-    hole += cylinder(r1=2*r, r2=r, h=1.4*r, center=True)
+    hole = translate([0, 0, length/2])(cylinder(r, h=length, center=True, segments=segments(2*r, 32)))
+    hole += cylinder(r1=2*r, r2=r, h=1.4*r, center=True, segments=segments(4*r, 32))
     return hole
 
 
@@ -142,15 +139,18 @@ def test_rod_clamp_tightness(tightnesses):
     return assembly
 
 
-if __name__ == '__main__':
-    header = "$fa = 5;"  # minimum face angle
-    header += "$fs = 0.1;"  # minimum face size
+# (file name, function without arguments) of the parts written by the __main__ block, also benchmarked (benchmark.py)
+main_parts = [
+    ("base_demo", lambda: cube((40, 40, 10), center=True) + base()),
+    ("label_100", lambda: base_rods30(z_length=100)),  # Long plate for sticker
+    ("test_clamp_tightness", lambda: test_rod_clamp_tightness([0, .05, .1])),
+]
 
-    upper = cube((40, 40, 10), center=True)
+
+if __name__ == '__main__':
+    header = scad_header()
 
     safe_mkdir("scad/misc")
 
-    scad_render_to_file(upper+base(), "scad/misc/base_demo.scad", file_header=header)
-    scad_render_to_file(base_rods30(z_length=100), "scad/misc/label_100.scad", file_header=header)  # Long plate for sticker
-    scad_render_to_file(test_rod_clamp_tightness([0, .05, .1]), "scad/misc/test_clamp_tightness.scad",
-                        file_header=header)
+    for name, part_func in main_parts:
+        scad_render_to_file(part_func(), "scad/misc/{}.scad".format(name), file_header=header)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Benchmark for all parts: every part of reference_assembly.part_list, and every part generated in the __main__ blocks
+of Holmos, cage, mirror_mount, round_mounts, led_mount and base.
+
+For each part, it measures
+- Python generation time (best of several runs)
+- CSG node count and scad file size
+- OpenSCAD render time and peak memory (skipped with --no-render or if openscad is not found)
+- triangle count of the rendered STL
+
+The results are written to benchmark/results.json and compared to benchmark/baseline.json.
+Any metric that got worse than the baseline by more than the tolerance is reported as a regression, and the
+exit code is 1. Run with --update-baseline to accept the current results as the new baseline.
+
+    python benchmark.py --resolution draft
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import time
+
+import Holmos
+import base
+import cage
+import led_mount
+import mirror_mount
+import reference_assembly
+import resolution
+import round_mounts
+import render_stl
+import stl_cache
+from config import current_config, use_config
+from csg_tools import count_nodes, write_scad
+from file_tools import safe_mkdir
+
+# metric -> absolute slack, on top of the relative tolerance (timing noise of very fast parts)
+compared_metrics = {
+    "generation_seconds": 0.005,
+    "csg_nodes": 0,
+    "scad_bytes": 0,
+    "render_seconds": 0.5,
+    "peak_rss_kb": 10 * 1024,
+    "triangles": 0,
+}
+
+
+def main_targets():
+    """(name, function without arguments) for every part generated in the modules' __main__ blocks"""
+    targets = []
+    for module in (Holmos, round_mounts):
+        for sweep in module.sweeps():
+            for point in sweep.points():
+                kwargs, config_changes = sweep.variant_arguments(point)
+                targets.append(("{}/{}".format(module.__name__, sweep.variant_name(point)),
+                                functools.partial(_build_variant, sweep.part_func, kwargs, config_changes)))
+    for module in (cage, mirror_mount, led_mount, base):
+        targets += [("{}/{}".format(module.__name__, name), part_func) for name, part_func in module.main_parts]
+    return targets
+
+
+def _build_variant(part_func, kwargs, config_changes):
+    with use_config(current_config().replace(**config_changes)):
+        return part_func(**kwargs)
+
+
+def reference_assembly_targets():
+    """(name, function without arguments) for the printable version of every part in the reference assembly"""
+    return [("reference_assembly/" + part.filename(number, extension=""),
+             functools.partial(part.part_func, assemble=False, **part.kwargs))
+            for number, part in enumerate(reference_assembly.part_list)]
+
+
+def benchmark_target(name, part_func, scad_dir, stl_dir, header, render=True, repeat=3):
+    """measure generation, scad output and (optionally) rendering of one part"""
+    generation_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        obj = part_func()
+        generation_times.append(time.perf_counter() - start)
+
+    filename = name.replace("/", " - ")
+    scad_file = write_scad(obj, os.path.join(scad_dir, filename + ".scad"), file_header=header)
+    result = {
+        "generation_seconds": min(generation_times),
+        "csg_nodes": count_nodes(obj),
+        "scad_bytes": os.path.getsize(scad_file),
+    }
+
+    if render:
+        stl_file = os.path.join(stl_dir, filename + ".stl")
+        if os.path.isfile(stl_file):
+            os.remove(stl_file)
+        return_code, seconds, peak_rss_kb = render_stl.run_openscad(scad_file, stl_file, render_stl.resolve_backend())
+        result["render_return_code"] = return_code
+        if return_code == 0 and os.path.isfile(stl_file):
+            result["render_seconds"] = seconds
+            result["peak_rss_kb"] = peak_rss_kb
+            result["triangles"] = render_stl.stl_triangle_count(stl_file)
+    return result
+
+
+def run_benchmark(render=True, repeat=3, scad_dir="scad/benchmark", stl_dir="stl/benchmark"):
+    """benchmark all targets. :return: dict with metadata ("info") and per-part results ("parts")"""
+    safe_mkdir(scad_dir, stl_dir)
+    header = resolution.scad_header()
+    info = {
+        "resolution": resolution.active_profile(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+    }
+    if render:
+        info["openscad"] = stl_cache.openscad_version(render_stl.path_to_openscad())
+        info["backend"] = render_stl.resolve_backend()
+
+    parts = {}
+    for name, part_func in reference_assembly_targets() + main_targets():
+        print("benchmarking", name)
+        parts[name] = benchmark_target(name, part_func, scad_dir, stl_dir, header, render, repeat)
+    return {"info": info, "parts": parts}
+
+
+def compare_to_baseline(results, baseline, tolerance=0.1):
+    """
+    :param tolerance: relative increase of a metric that is still accepted
+    :return: list of regression messages
+    """
+    for key in ("resolution", "openscad", "backend"):
+        if key in results["info"] and results["info"].get(key) != baseline["info"].get(key):
+            print("warning: baseline was made with {} {}, now {}".format(key, baseline["info"].get(key),
+                                                                       results["info"][key]))
+
+    regressions = []
+    for name, part in results["parts"].items():
+        if name not in baseline["parts"]:
+            print("new part, not in baseline:", name)
+            continue
+        for metric, slack in compared_metrics.items():
+            new, old = part.get(metric), baseline["parts"][name].get(metric)
+            if new is None or old is None:
+                continue
+            if new > old * (1 + tolerance) + slack:
+                regressions.append("{}: {} {:g} -> {:g} ({:+.0%})".format(name, metric, old, new,
+                                                                         new / old - 1 if old else float("inf")))
+    return regressions
+
+
+def print_results(results):
+    print("{:60s} {:>9s} {:>7s} {:>8s} {:>9s} {:>8s} {:>10s}".format(
+        "part", "gen [ms]", "nodes", "scad kB", "render s", "RSS MB", "triangles"))
+    for name, part in results["parts"].items():
+        render_seconds = part.get("render_seconds")
+        peak_rss_kb = part.get("peak_rss_kb")
+        print("{:60s} {:>9.1f} {:>7d} {:>8.1f} {:>9s} {:>8s} {:>10s}".format(
+            name, 1000 * part["generation_seconds"], part["csg_nodes"], part["scad_bytes"] / 1000,
+            "-" if render_seconds is None else "{:.1f}".format(render_seconds),
+            "-" if peak_rss_kb is None else "{:.0f}".format(peak_rss_kb / 1024),
+            str(part.get("triangles", "-"))))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark scad generation and rendering of all parts")
+    parser.add_argument("--no-render", action="store_true", help="only measure scad generation")
+    parser.add_argument("--repeat", type=int, default=3, help="generation runs per part, the fastest counts")
+    parser.add_argument("--resolution", choices=sorted(resolution.PROFILES), default=None,
+                        help="resolution profile (default: see global_settings.ini)")
+    parser.add_argument("--output", default="benchmark/results.json")
+    parser.add_argument("--baseline", default="benchmark/baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative increase of a metric that is not yet a regression")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as new baseline")
+    args = parser.parse_args()
+
+    if args.resolution is not None:
+        resolution.set_profile(args.resolution)
+    render = not args.no_render
+    if render and not os.path.isfile(render_stl.path_to_openscad()):
+        print("could not find openscad at {}, only measuring scad generation".format(render_stl.path_to_openscad()))
+        render = False
+
+    results = run_benchmark(render=render, repeat=args.repeat)
+    print_results(results)
+
+    safe_mkdir(os.path.dirname(args.output))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=1)
+    print("results written to", args.output)
+
+    if args.update_baseline:
+        safe_mkdir(os.path.dirname(args.baseline))
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=1)
+        print("baseline updated:", args.baseline)
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            exit(1)
+        print("no regressions compared to", args.baseline)
+    else:
+        print("no baseline at {}, run with --update-baseline to create one".format(args.baseline))
@@ -13,8 +13,12 @@ from solid import rotate, translate, cube, cylinder, mirror, hole, scad_render_t
 
 from Holmos import strut_with_holes
 import base
+from config import current_config
 from file_tools import safe_mkdir
 from helpers import rounded_plate
+from parts import printable_part
+from resolution import facet_budget, scad_header, segments
+from subpart_cache import prerendered
 
 
 def rpi_mount(assemble=False, hole_diam=3):
@@ -81,6 +85,7 @@ def cage_stabilizer(assemble=False):
     return stabilizer
 
 
+@prerendered
 def cage_3_clips(z_length=10, inside=False):
     """3 clips arranged in proper distances for cage, aligned to optical axis at 0,0."""
     third_rod_y = base.rods30_dist_third_rod-25  # main pair of rods is at y=-25
@@ -155,12 +160,13 @@ def cage_base_plate(assemble=False):
     return plate
 
 
+@printable_part(lambda hook: translate((0, -50, 0))(rotate((0, 180, 180))(hook)))
 def board_hook(clip_z=30, hook_opening=18, assemble=False):
     """
     Hook for topmost end of cage - can be used to hang setup from a door, whiteboard, poster board, cabinet...
     2019-05-13 - printed, works well. But: real-life poster board is one inch thick.
     """
-    assert base.__rods30, "this only makes sense for rod-mount"
+    assert current_config().rods30, "this only makes sense for rod-mount"
 
     rod_clips = base.base_rods30(z_length=clip_z)
     rod_clips = translate((0, 0, clip_z / 2))(rod_clips)  # start at z=0
@@ -178,14 +184,11 @@ def board_hook(clip_z=30, hook_opening=18, assemble=False):
     strut = translate((hook_width/2-hook_thick, (hook_opening-40)/2, strut_height/2))(strut)
     strut += mirror((1, 0, 0))(strut)
 
-    assembly = rod_clips + hook + strut
-
-    if assemble:
-        return translate((0, -50, 0))(rotate((0, 180, 180))(assembly))
-    else:
-        return assembly
+    return rod_clips + hook + strut
 
 
+@printable_part()
+@facet_budget(32)
 def cage_circumference(d_outer=80.5, wall_thick=2, h=10,assemble=None):
     """Circle to fit cage ends, e.g. to transport cage inside a cylindrical tube"""
     d_inner = base.rods30_dist_third_rod+7  # absolute diameter: contact to clips.
@@ -195,9 +198,10 @@ def cage_circumference(d_outer=80.5, wall_thick=2, h=10,assemble=None):
     back_face = cube((2*circ_x_at_clamp, wall_thick, h), center=True)
     back_face = translate((0, -30+wall_thick/2, h/2))(back_face)
 
-    circle = cylinder(d=d_outer, h=h)
-    circle -= translate((0, 0, wall_thick))(cylinder(d=d_outer-2*wall_thick, h=2*h))  # relative diameter: wall thickness
-    circle -= translate((0, 0, -2))(cylinder(d=d_inner, h=2*h))
+    circle = cylinder(d=d_outer, h=h, segments=segments(d_outer))
+    d_wall = d_outer-2*wall_thick  # relative diameter: wall thickness
+    circle -= translate((0, 0, wall_thick))(cylinder(d=d_wall, h=2*h, segments=segments(d_wall)))
+    circle -= translate((0, 0, -2))(cylinder(d=d_inner, h=2*h, segments=segments(d_inner)))
 
     # clear space past -y of clamps, so that cage can rest against wall when used with hook.
     helper_block_y = 30
@@ -206,34 +210,27 @@ def cage_circumference(d_outer=80.5, wall_thick=2, h=10,assemble=None):
     # add some holes to screw cage onto something
     for angle_deg in (-30, 30, 150, 210):
         hole_position = lambda obj: rotate(angle_deg)(translate((d_inner/2, 0, 0))(obj))
-        circle += hole_position(cylinder(d=8, h=wall_thick))
-        circle -= hole_position(cylinder(d=3.2, h=2*h, center=True))
+        circle += hole_position(cylinder(d=8, h=wall_thick, segments=segments(8, 48)))
+        circle -= hole_position(cylinder(d=3.2, h=2*h, center=True, segments=segments(3.2, 32)))
 
     return clamp + circle + back_face
 
 
-if __name__ == "__main__":
-    import os
+# (file name, function without arguments) of the parts written by the __main__ block, also benchmarked (benchmark.py)
+main_parts = [
+    ("Cage_Stabilizer", cage_stabilizer),
+    ("Cage_Side_Stabilizer", cage_side_stabilizer),
+    ("Cage_Base_Plate", cage_base_plate),
+    ("rpi_mount", rpi_mount),
+    ("wall_hook", board_hook),
+    ("cage_circumference", cage_circumference),
+]
 
-    _fine = True
-    render_STL = False
 
-    if _fine:
-        header = "$fa = 5;"  # minimum face angle
-        header += "$fs = 0.1;"  # minimum face size
-    else:
-        header = ""
+if __name__ == "__main__":
+    header = scad_header()
 
     safe_mkdir("scad/misc")
 
-    scad_render_to_file(cage_stabilizer(), "scad/misc/Cage_Stabilizer.scad", file_header=header)
-
-    scad_render_to_file(cage_side_stabilizer(), "scad/misc/Cage_Side_Stabilizer.scad", file_header=header)
-
-    scad_render_to_file(cage_base_plate(), "scad/misc/Cage_Base_Plate.scad", file_header=header)
-
-    scad_render_to_file(rpi_mount(), "scad/misc/rpi_mount.scad", file_header=header)
-
-    scad_render_to_file(board_hook(), "scad/misc/wall_hook.scad", file_header=header)
-
-    scad_render_to_file(cage_circumference(), "scad/misc/cage_circumference.scad", file_header=header)
+    for name, part_func in main_parts:
+        scad_render_to_file(part_func(), "scad/misc/{}.scad".format(name), file_header=header)
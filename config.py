@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Configuration of the parts and the build, from global_settings.ini.
+
+The ini file is parsed once, into a HolmosConfig. Part functions read their settings from current_config() when they
+are called, not when they are imported, so one process can build variants with different settings:
+
+    with use_config(current_config().replace(rods30_tightness=.05)):
+        clamp = base.single_rod_clamp()
+
+use_config() only applies to the current thread or asyncio task (it is based on contextvars), so several variants can
+be built concurrently. Threads started with concurrent.futures do not inherit it; use asyncio.to_thread or
+contextvars.copy_context().run, or pass the config to the thread and call use_config there.
+set_default_config() changes the configuration for the whole process, e.g. in worker processes.
+"""
+import configparser
+import contextlib
+import contextvars
+import copy
+import functools
+import os
+import platform
+
+os_is = platform.system().lower()  # 'windows', 'darwin' or 'linux'
+
+
+class HolmosConfig:
+    # settings that change the geometry of the parts; the others only change how they are built
+    geometry_fields = ("threads20", "rods30", "rods30_tightness", "resolution")
+
+    def __init__(self, threads20=False, rods30=True, rods30_tightness=.1, path_to_openscad="not configured", jobs=0,
+                 stl_cache_dir=".stl_cache", backend="auto", resolution="print", memory_reserve_mb=1024,
+                 job_memory_limit_mb=0, job_timeout=0, bed_size_mm=(223, 223, 205),
+                 plate_spacing_mm=5):
+        """
+        :param threads20: mount the parts with Owis 20mm threads (see base.base_threads20)
+        :param rods30: mount the parts on two 6mm rods, 30mm apart (see base.base_rods30)
+        :param rods30_tightness: diameter reduction of the rod clamps, larger values give a tighter fit
+        The other parameters are described in global_settings.ini
+        """
+        self.threads20 = threads20
+        self.rods30 = rods30
+        self.rods30_tightness = rods30_tightness
+        self.path_to_openscad = path_to_openscad
+        self.jobs = jobs
+        self.stl_cache_dir = stl_cache_dir
+        self.backend = backend
+        self.resolution = resolution
+        self.memory_reserve_mb = memory_reserve_mb
+        self.job_memory_limit_mb = job_memory_limit_mb
+        self.job_timeout = job_timeout
+        self.bed_size_mm = tuple(bed_size_mm)
+        self.plate_spacing_mm = plate_spacing_mm
+
+    @classmethod
+    def from_ini(cls, path="global_settings.ini"):
+        parser = configparser.ConfigParser()
+        parser.read(path)
+        return cls(
+            threads20=parser.getboolean("mount", "Threads20mm"),
+            rods30=parser.getboolean("mount", "Rods6mmBy30mm"),
+            rods30_tightness=parser.getfloat("mount", "Rods6mm_tightness"),
+            path_to_openscad=parser.get("environ", f"{os_is}_path_to_openscad", fallback="not configured"),
+            jobs=parser.getint("render", "jobs", fallback=0),
+            stl_cache_dir=parser.get("render", "stl_cache_dir", fallback=".stl_cache"),
+            backend=parser.get("render", "backend", fallback="auto"),
+            resolution=os.environ.get("HOLMOS_RESOLUTION", parser.get("render", "resolution", fallback="print")),
+            memory_reserve_mb=parser.getint("render", "memory_reserve_mb", fallback=1024),
+            job_memory_limit_mb=parser.getint("render", "job_memory_limit_mb", fallback=0),
+            job_timeout=parser.getint("render", "job_timeout", fallback=0),
+            bed_size_mm=[float(size) for size in
+                         parser.get("print", "bed_size_mm", fallback="223, 223, 205").split(",")],
+            plate_spacing_mm=parser.getfloat("print", "plate_spacing_mm", fallback=5),
+        )
+
+    def replace(self, **changes):
+        """copy of this configuration with some settings changed"""
+        for name in changes:
+            if not hasattr(self, name):
+                raise TypeError("unknown setting {}".format(name))
+        changed = copy.copy(self)
+        vars(changed).update(changes)
+        return changed
+
+    def validate(self):
+        if self.threads20 and self.rods30:
+            raise ValueError("bad configuration: select either Threads20mm or Rods6mmBy30mm, not both")
+        return self
+
+    def geometry_settings(self):
+        """the settings that change the geometry, e.g. for fingerprints and cache keys"""
+        return {name: getattr(self, name) for name in self.geometry_fields}
+
+    def __repr__(self):
+        return "HolmosConfig({})".format(", ".join("{}={!r}".format(k, v) for k, v in vars(self).items()))
+
+
+@functools.lru_cache(maxsize=None)
+def load(path="global_settings.ini"):
+    """configuration from the ini file at path, parsed only once"""
+    return HolmosConfig.from_ini(path)
+
+
+_default = None  # process-wide configuration, see set_default_config
+_current = contextvars.ContextVar("holmos_config", default=None)
+
+
+def default_config():
+    return _default if _default is not None else load()
+
+
+def set_default_config(config):
+    """use config in the whole process, wherever use_config() does not select another one"""
+    global _default
+    _default = config
+
+
+def current_config():
+    """the configuration selected by use_config(), else the default configuration"""
+    config = _current.get()
+    return config if config is not None else default_config()
+
+
+@contextlib.contextmanager
+def use_config(config):
+    """use config for everything built inside the with block, in this thread or asyncio task"""
+    token = _current.set(config)
+    try:
+        yield config
+    finally:
+        _current.reset(token)
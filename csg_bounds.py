@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Axis-aligned bounding boxes of solidpython CSG trees, computed from the primitives' parameters, without openscad.
+
+The box of a node is derived from the boxes of its children: transforms move the eight corners of the child's box
+(see csg_tools.affine_matrix), union and hull enclose all children, difference is the box of the first child,
+intersection the overlap of all children, and so on. The boxes are conservative: the part is inside, but e.g. a
+rotated cylinder's box is larger than the part. Holes (hole()) and disabled or background nodes (* and %) add no
+material and are left out. Text is estimated from the font size and the number of characters.
+
+Boxes are numpy arrays [[x_min, y_min, z_min], [x_max, y_max, z_max]], None for empty geometry; 2D shapes have z = 0.
+They are cached per node, so asking again for a subtree that is used in several places, or for a part that was
+built before (see parts.enable_memo), is a dictionary lookup. Nodes must not be changed in place (obj.add())
+after their box was computed.
+
+    python csg_bounds.py  # boxes of all parts of the reference assembly, in place
+"""
+import weakref
+
+import numpy
+
+from csg_tools import affine_matrix
+
+_cache = weakref.WeakKeyDictionary()  # node -> box
+_union_like = ("union", "hull", "color", "render", "part", "group")
+
+
+def bounds(obj):
+    """bounding box of obj, see module docstring. Raises ValueError for nodes whose extent is unknown."""
+    try:
+        return _cache[obj]
+    except KeyError:
+        pass
+    box = _compute(obj)
+    if box is not None:
+        box.flags.writeable = False  # shared with every later call
+    _cache[obj] = box
+    return box
+
+
+def _compute(node):
+    if node.is_hole or node.modifier in ("*", "%"):
+        return None
+    name, params = node.name, node.params
+
+    matrix = affine_matrix(node)
+    if matrix is not None:
+        return transform_box(_children_union(node), matrix)
+    if name in _union_like:
+        return _children_union(node)
+    if name == "difference":
+        children = [child for child in node.children if not child.is_hole]
+        return bounds(children[0]) if children else None
+    if name == "intersection":
+        return _intersection([bounds(child) for child in node.children if not child.is_hole])
+    if name == "minkowski":
+        boxes = [bounds(child) for child in node.children]
+        if any(box is None for box in boxes) or not boxes:
+            return None
+        return numpy.sum(boxes, axis=0)
+    if name in _primitives:
+        return _primitives[name](params)
+    if name == "linear_extrude":
+        return _linear_extrude(_children_union(node), params)
+    if name == "rotate_extrude":
+        child = _children_union(node)
+        if child is None:
+            return None
+        radius = numpy.abs(child[:, 0]).max()
+        return numpy.array([[-radius, -radius, child[0, 1]], [radius, radius, child[1, 1]]])
+    if name == "offset":
+        child = _children_union(node)
+        grow = max(float(params.get("r") or params.get("delta") or 0), 0)
+        return None if child is None else child + numpy.array([[-grow, -grow, 0], [grow, grow, 0]])
+    if name == "projection":
+        child = _children_union(node)
+        return None if child is None else child * numpy.array([1., 1., 0.])
+    if name == "resize":
+        return _resize(_children_union(node), params)
+    if name == "import":
+        return _import(params)
+    raise ValueError("bounding box of {}() is unknown".format(name))
+
+
+def _children_union(node):
+    return _union([bounds(child) for child in node.children])
+
+
+def _union(boxes):
+    boxes = [box for box in boxes if box is not None]
+    if not boxes:
+        return None
+    stacked = numpy.array(boxes)
+    return numpy.array([stacked[:, 0].min(axis=0), stacked[:, 1].max(axis=0)])
+
+
+def _intersection(boxes):
+    if not boxes or any(box is None for box in boxes):
+        return None
+    stacked = numpy.array(boxes)
+    box = numpy.array([stacked[:, 0].max(axis=0), stacked[:, 1].min(axis=0)])
+    return box if numpy.all(box[0] <= box[1]) else None
+
+
+def transform_box(box, matrix):
+    """box enclosing the eight corners of box, moved by the 4x4 matrix"""
+    if box is None:
+        return None
+    corners = numpy.array([[x, y, z, 1.] for x in box[:, 0] for y in box[:, 1] for z in box[:, 2]])
+    moved = corners @ matrix.T
+    return numpy.array([moved[:, :3].min(axis=0), moved[:, :3].max(axis=0)])
+
+
+def _radius(params, r="r", d="d"):
+    if params.get(r) is not None:
+        return float(params[r])
+    if params.get(d) is not None:
+        return float(params[d]) / 2
+    return None
+
+
+def _cube(params):
+    size = params.get("size", 1)
+    size = numpy.array([float(s) for s in size] if numpy.ndim(size) else [float(size)] * 3)
+    low = -size / 2 if params.get("center") else numpy.zeros(3)
+    return numpy.array([low, low + size])
+
+
+def _cylinder(params):
+    radii = [_radius(params, "r1", "d1"), _radius(params, "r2", "d2")]
+    radius = _radius(params)
+    radius = max([r for r in radii if r is not None] or [radius if radius is not None else 1.])
+    h = float(params.get("h") or 1)
+    z = (-h / 2, h / 2) if params.get("center") else (0, h)
+    return numpy.array([[-radius, -radius, z[0]], [radius, radius, z[1]]])
+
+
+def _sphere(params):
+    radius = _radius(params)
+    radius = 1. if radius is None else radius
+    return numpy.array([[-radius] * 3, [radius] * 3])
+
+
+def _square(params):
+    size = params.get("size", 1)
+    size = [float(s) for s in size] if numpy.ndim(size) else [float(size)] * 2
+    low = [-size[0] / 2, -size[1] / 2] if params.get("center") else [0, 0]
+    return numpy.array([[low[0], low[1], 0], [low[0] + size[0], low[1] + size[1], 0]])
+
+
+def _circle(params):
+    radius = _radius(params)
+    radius = 1. if radius is None else radius
+    return numpy.array([[-radius, -radius, 0], [radius, radius, 0]])
+
+
+def _polygon(params):
+    points = numpy.array(params["points"], dtype=float)[:, :2]
+    return numpy.array([[*points.min(axis=0), 0], [*points.max(axis=0), 0]])
+
+
+def _text(params):
+    """estimate: characters at most one font size wide, ascent plus descent within 1.5 font sizes"""
+    size = float(params.get("size") or 10)
+    width = size * len(str(params.get("text", ""))) * float(params.get("spacing") or 1)
+    x = {"center": (-width / 2, width / 2), "right": (-width, 0)}.get(params.get("halign"), (0, width))
+    y = {"center": (-.75 * size, .75 * size), "top": (-1.5 * size, 0),
+         "bottom": (0, 1.5 * size)}.get(params.get("valign"), (-.5 * size, size))
+    return numpy.array([[x[0], y[0], 0], [x[1], y[1], 0]])
+
+
+_primitives = {"cube": _cube, "cylinder": _cylinder, "sphere": _sphere, "square": _square, "circle": _circle,
+               "polygon": _polygon, "text": _text}
+
+
+def _linear_extrude(child, params):
+    if child is None:
+        return None
+    xy = child[:, :2]
+    scale = params.get("scale")
+    if scale is not None:  # the top is the bottom scaled about the origin
+        xy = numpy.concatenate([xy, xy * numpy.array(scale, dtype=float)])
+    if params.get("twist"):  # rotated about z: inside the circle through the furthest corner
+        radius = numpy.linalg.norm(numpy.array([[x, y] for x in xy[:, 0] for y in xy[:, 1]]), axis=1).max()
+        xy = numpy.array([[-radius, -radius], [radius, radius]])
+    h = float(params.get("height") or 100)
+    z = (-h / 2, h / 2) if params.get("center") else (0, h)
+    return numpy.array([[*xy.min(axis=0), z[0]], [*xy.max(axis=0), z[1]]])
+
+
+def _resize(child, params):
+    if child is None:
+        return None
+    size = child[1] - child[0]
+    new_size = numpy.array(list(params.get("newsize")) + [0] * 3, dtype=float)[:3]
+    factor = numpy.divide(new_size, size, out=numpy.ones(3), where=(new_size > 0) & (size > 0))
+    return numpy.sort(child * factor, axis=0)
+
+
+def _import(params):
+    import stl_tools  # only needed for imported STLs, e.g. pre-rendered sub-parts
+
+    triangles = stl_tools.read_stl(params["file"])
+    if len(triangles) == 0:
+        return None
+    return numpy.array([triangles.min(axis=(0, 1)), triangles.max(axis=(0, 1))], dtype=float)
+
+
+def size(box):
+    """(x, y, z) extent of a box, 0 for None"""
+    return numpy.zeros(3) if box is None else box[1] - box[0]
+
+
+def overlap(box_a, box_b, clearance=0.):
+    """True if the boxes overlap, or are closer than clearance"""
+    if box_a is None or box_b is None:
+        return False
+    return bool(numpy.all(box_a[0] - clearance < box_b[1]) and numpy.all(box_b[0] - clearance < box_a[1]))
+
+
+if __name__ == '__main__':
+    import time
+
+    import parts
+    from reference_assembly import part_list, z0
+
+    parts.enable_memo()
+    print("{:30s} {:>24s} {:>24s}".format("part", "min (x, y, z) mm", "max (x, y, z) mm"))
+    for number, component in enumerate(part_list):
+        box = bounds(component.part_func(assemble=True, **component.kwargs)) + [0, 0, z0 + component.z]
+        print("{:30s} {:>24s} {:>24s}".format(component.filename(number, ""),
+                                              ", ".join("{:.1f}".format(v) for v in box[0]),
+                                              ", ".join("{:.1f}".format(v) for v in box[1])))
+
+    obj = component.part_func(assemble=True, **component.kwargs)
+    start = time.perf_counter()
+    for _ in range(1000):
+        bounds(obj)
+    print("cached: {:.1f} us per call".format((time.perf_counter() - start) * 1000))
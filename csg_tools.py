@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Tools that work on the solidpython CSG tree of a part, before it is written to a scad file.
+
+Helpers like base.single_rod_clamp or helpers.rounded_plate end up in a part many times, and solidpython writes the
+same subtree again at each of these places. write_scad() instead writes structurally identical subtrees once, as an
+OpenSCAD module, and calls the module wherever the subtree is used.
+This keeps the scad files small, and OpenSCAD only needs to evaluate each module once (geometry cache).
+
+optimize_csg() simplifies the tree before it is written: chains of transforms become one multmatrix, identity
+transforms and nested unions disappear, and "plate -= hole" loops become a single difference against a balanced
+union of all holes, so that CGAL subtracts from the large plate once instead of once per hole.
+
+solidpython moves holes (hole()) to the top of the part, so they are not part of a module: a module only contains
+the positive geometry of its subtree, and the holes are subtracted at the top of the part as before.
+"""
+import copy
+import hashlib
+import os
+
+import numpy
+from solid import scad_render, translate, multmatrix, union, difference
+from solid.solidpython import non_rendered_classes, indent, _find_include_strings
+
+# inside holes, solidpython replaces difference/intersection by union - cannot happen inside a module
+_changed_inside_holes = ("difference", "intersection")
+
+
+def count_nodes(obj):
+    """number of nodes in the tree below obj (including obj), counting shared subtrees at each use"""
+    counts = {}
+
+    def count(node):
+        if id(node) not in counts:
+            counts[id(node)] = 1 + sum(count(child) for child in node.children)
+        return counts[id(node)]
+
+    return count(obj)
+
+
+def affine_matrix(node):
+    """4x4 matrix of a translate, rotate, scale, mirror or multmatrix node, None for other nodes"""
+    params = node.params
+    matrix = numpy.eye(4)
+    if node.name == "translate":
+        v = _vec3(params.get("v"), 0)
+        matrix[:3, 3] = v
+    elif node.name == "scale":
+        v = params.get("v")
+        matrix[:3, :3] = numpy.diag(_vec3(v, 1) if numpy.ndim(v) else [v, v, v])
+    elif node.name == "mirror":
+        normal = _vec3(params.get("v"), 0)
+        length_squared = normal @ normal
+        if length_squared > 0:
+            matrix[:3, :3] -= 2 * numpy.outer(normal, normal) / length_squared
+    elif node.name == "rotate":
+        a, v = params.get("a"), params.get("v")
+        if a is None:
+            return matrix
+        if numpy.ndim(a):  # [x, y, z]: about x, then y, then z
+            ax, ay, az = _vec3(a, 0)
+            matrix[:3, :3] = _rotation((0, 0, 1), az) @ _rotation((0, 1, 0), ay) @ _rotation((1, 0, 0), ax)
+        else:
+            matrix[:3, :3] = _rotation(_vec3(v, 0) if v is not None else (0, 0, 1), a)
+    elif node.name == "multmatrix":
+        m = numpy.array(params.get("m"), dtype=float)
+        matrix[:m.shape[0], :m.shape[1]] = m
+    else:
+        return None
+    return matrix
+
+
+def _vec3(v, fill):
+    """OpenSCAD pads short vectors: translate([x, y]) is translate([x, y, 0])"""
+    v = [float(x) for x in v] if v is not None else []
+    return numpy.array((v + [fill] * 3)[:3])
+
+
+def _rotation(axis, angle_deg):
+    axis = numpy.array(axis, dtype=float)
+    norm = numpy.linalg.norm(axis)
+    if norm == 0:
+        return numpy.eye(3)
+    x, y, z = axis / norm
+    angle = numpy.deg2rad(float(angle_deg))
+    c, s = numpy.cos(angle), numpy.sin(angle)
+    return numpy.array([[c + x*x*(1-c), x*y*(1-c) - z*s, x*z*(1-c) + y*s],
+                        [y*x*(1-c) + z*s, c + y*y*(1-c), y*z*(1-c) - x*s],
+                        [z*x*(1-c) - y*s, z*y*(1-c) + x*s, c + z*z*(1-c)]])
+
+
+def _is_plain(node):
+    """no modifier, hole or part root: can be merged with other nodes"""
+    return not (node.modifier or node.is_hole or node.is_part_root)
+
+
+def _with_children(node, children):
+    """node with new children; node itself if nothing changed"""
+    if len(children) == len(node.children) and all(new is old for new, old in zip(children, node.children)):
+        return node
+    new = copy.copy(node)
+    new.params = dict(node.params)
+    new.traits = dict(node.traits)
+    new.children = []
+    new.parent = None
+    new.add(children)
+    return new
+
+
+def _transform_node(matrix, child):
+    """child moved by matrix, as translate() if possible, otherwise multmatrix()"""
+    matrix = numpy.round(matrix, 12) + 0.  # + 0. turns -0 into 0
+    if numpy.allclose(matrix, numpy.eye(4), rtol=0, atol=1e-12):
+        return child
+    if numpy.allclose(matrix[:3, :3], numpy.eye(3), rtol=0, atol=1e-12):
+        return translate(v=[float(x) for x in matrix[:3, 3]])(child)
+    return multmatrix(m=[[float(x) for x in row] for row in matrix])(child)
+
+
+def _balanced_union(nodes):
+    if len(nodes) == 1:
+        return nodes[0]
+    middle = len(nodes) // 2
+    return union()(_balanced_union(nodes[:middle]), _balanced_union(nodes[middle:]))
+
+
+class _CsgOptimizer:
+    def __init__(self):
+        self.optimized = {}  # id(original node) -> optimized node, keeps shared subtrees shared
+        self.part_roots_below = {}  # id(original node) -> True if there is a part root below it
+
+    def optimize(self, node):
+        if id(node) not in self.optimized:
+            self.optimized[id(node)] = self._optimize(node)
+        return self.optimized[id(node)]
+
+    def _has_part_roots(self, node):
+        if id(node) not in self.part_roots_below:
+            self.part_roots_below[id(node)] = any(child.is_part_root or self._has_part_roots(child)
+                                                  for child in node.children)
+        return self.part_roots_below[id(node)]
+
+    def _optimize(self, node):
+        # solidpython's find_hole_children() does not take a part root off its path again, so which holes of a part
+        # are also subtracted from the whole tree depends on the nodes above the part root: keep them as they are.
+        if not _is_plain(node) or self._has_part_roots(node):
+            return _with_children(node, [self.optimize(child) for child in node.children])
+
+        if node.name == "difference" and node.children:
+            return self._difference(node)
+
+        children = [self.optimize(child) for child in node.children]
+
+        matrix = affine_matrix(node)
+        if matrix is not None and len(children) == 1:
+            child = children[0]
+            child_matrix = affine_matrix(child)
+            if child_matrix is not None and _is_plain(child) and len(child.children) == 1:
+                return _transform_node(matrix @ child_matrix, child.children[0])
+            if numpy.allclose(matrix, numpy.eye(4), rtol=0, atol=1e-12):
+                return child
+            return _with_children(node, children)
+
+        if node.name == "union":
+            flat_children = []
+            for child in children:
+                if child.name == "union" and _is_plain(child):
+                    flat_children.extend(child.children)
+                else:
+                    flat_children.append(child)
+            if len(flat_children) == 1 and not flat_children[0].is_hole:
+                return flat_children[0]
+            return _with_children(node, flat_children)
+
+        return _with_children(node, children)
+
+    def _difference(self, node):
+        """difference(difference(a, b), c) ... -> difference(a, union(b, c, ...))"""
+        subtracted = []
+        while True:
+            subtracted = list(node.children[1:]) + subtracted
+            first = node.children[0]
+            if not (first.name == "difference" and _is_plain(first) and first.children):
+                break
+            node = first
+
+        first = self.optimize(first)
+        subtracted = [self.optimize(child) for child in subtracted]
+        if len(subtracted) < 2:
+            return difference()(first, *subtracted)
+        return difference()(first, _balanced_union(subtracted))
+
+
+def optimize_csg(obj, name=None):
+    """
+    Simplified copy of the tree below obj (obj is not changed):
+    - consecutive transforms are collapsed into one translate or multmatrix
+    - identity transforms are dropped
+    - nested unions are flattened
+    - chains of differences become one difference against a balanced union
+    Holes, part roots, the nodes above part roots and nodes with a modifier (#, %, ...) are kept as they are.
+    :param name: if given, print the node count before and after
+    """
+    optimized = _CsgOptimizer().optimize(obj)
+    if name is not None:
+        print("{}: {} -> {} CSG nodes".format(name, count_nodes(obj), count_nodes(optimized)))
+    return optimized
+
+
+class _SubtreeInfo:
+    def __init__(self, node, size, is_plain, has_holes, hole_safe):
+        self.node = node  # first node found with this structure
+        self.size = size  # number of nodes
+        self.is_plain = is_plain  # neither a hole nor a part root, and no part roots inside
+        self.has_holes = has_holes
+        self.hole_safe = hole_safe  # renders the same inside a hole
+        self.uses = 0  # uses in the expanded tree
+
+
+class _SharedModuleRenderer:
+    """
+    Renders a solidpython tree like solidpython's OpenSCADObject._render(),
+    but calls a module instead of repeating identical subtrees.
+    """
+
+    def __init__(self, root, min_nodes=3, module_prefix="shared"):
+        self.root = root
+        self.keys = {}  # id(node) -> structural key
+        self.subtrees = {}  # key -> _SubtreeInfo
+
+        root.find_hole_children()  # sets has_hole_children, as solidpython does before rendering
+        self._key(root)
+        self._count_uses(root)
+
+        modules = {key: key for key, info in self.subtrees.items()
+                   if info.is_plain and info.uses >= 2 and info.size >= min_nodes}
+
+        # subtrees repeated only inside a larger module are called once from its body; not worth a module.
+        while True:
+            calls = {}
+            self._render(root, modules, calls, {})
+            single_use = {key for key in modules if calls.get(key, 0) < 2}
+            if not single_use:
+                break
+            for key in single_use:
+                del modules[key]
+
+        self.module_names = {}  # key -> module name, children before parents
+        for key in self.subtrees:
+            if key in modules:
+                self.module_names[key] = "{}_{}".format(module_prefix, len(self.module_names))
+
+    def _key(self, node):
+        if id(node) in self.keys:
+            return self.keys[id(node)]
+
+        child_keys = [self._key(child) for child in node.children]
+        sha = hashlib.sha1()
+        sha.update(node._render_str_no_children().encode())
+        sha.update("|hole={}|part={}|".format(node.is_hole, node.is_part_root).encode())
+        sha.update(",".join(child_keys).encode())
+        key = sha.hexdigest()
+        self.keys[id(node)] = key
+
+        if key not in self.subtrees:
+            children = [self.subtrees[child_key] for child_key in child_keys]
+            self.subtrees[key] = _SubtreeInfo(
+                node,
+                size=1 + sum(child.size for child in children),
+                is_plain=not (node.is_hole or node.is_part_root)
+                and all(child.is_plain or child.node.is_hole for child in children),
+                has_holes=node.is_hole or any(child.has_holes for child in children),
+                hole_safe=node.name not in _changed_inside_holes and all(child.hole_safe for child in children))
+        return key
+
+    def _count_uses(self, node):
+        self.subtrees[self.keys[id(node)]].uses += 1
+        for child in node.children:
+            self._count_uses(child)
+
+    def render(self, file_header=""):
+        includes = ''.join(_find_include_strings(self.root)) + "\n"
+        if file_header and not file_header.endswith('\n'):
+            file_header += '\n'
+
+        calls = {}
+        bodies = {}
+        scad_body = self._render(self.root, self.module_names, calls, bodies)
+
+        modules = ""
+        for key, name in self.module_names.items():
+            modules += "\n// {} nodes, used {} times".format(self.subtrees[key].size, calls[key])
+            modules += "\nmodule {}() {{".format(name) + indent(bodies[key]) + "\n}\n"
+
+        return file_header + includes + modules + scad_body
+
+    def _module_key(self, node, modules, render_holes):
+        """key of the module to call instead of rendering node, or None"""
+        key = self.keys[id(node)]
+        if key not in modules or node is self.root:
+            return None
+        info = self.subtrees[key]
+        # Module bodies are rendered like positive geometry: holes below node are left out, and are subtracted at
+        # the top of the part as usual. Inside a hole, that would be wrong.
+        if render_holes and (info.has_holes or not info.hole_safe):
+            return None
+        return key
+
+    def _render(self, node, modules, calls, bodies, render_holes=False, as_module_body=False):
+        """solidpython's OpenSCADObject._render(), with module calls for the subtrees in modules"""
+        if not as_module_body:
+            key = self._module_key(node, modules, render_holes)
+            if key is not None:
+                calls[key] = calls.get(key, 0) + 1
+                if calls[key] == 1:  # first use: render the body once
+                    bodies[key] = self._render(node, modules, calls, bodies, as_module_body=True)
+                return "\n{}();".format(modules[key])
+
+        s = ""
+        for child in node.children:
+            if not render_holes and child.is_hole:
+                continue
+            s += self._render(child, modules, calls, bodies, render_holes)
+
+        if node.name in non_rendered_classes:
+            pass
+        elif not node.children:
+            s = node._render_str_no_children() + ";"
+        else:
+            s = node._render_str_no_children() + " {" + indent(s) + "\n}"
+
+        if node is self.root or node.is_part_root:
+            hole_children = node.find_hole_children()
+            if len(hole_children) > 0:
+                s += "\n/* Holes Below*/"
+                s += self._render_hole_children(node, modules, calls, bodies)
+                s = "\ndifference(){" + indent(s) + " /* End Holes */ \n}"
+        return s
+
+    def _render_hole_children(self, node, modules, calls, bodies):
+        if not node.has_hole_children:
+            return ""
+        s = ""
+        for child in node.children:
+            if child.is_hole:
+                s += self._render(child, modules, calls, bodies, render_holes=True)
+            elif child.has_hole_children:
+                s += self._render_hole_children(child, modules, calls, bodies)
+        if node.name not in non_rendered_classes:
+            s = node._render_str_no_children() + "{" + indent(s) + "\n}"
+
+        s = s.replace("intersection", "union")
+        s = s.replace("difference", "union")
+        return s
+
+
+def scad_render_shared(obj, file_header="", min_nodes=3):
+    """
+    Like solid.scad_render(), but repeated subtrees of at least min_nodes nodes are written once as a module.
+    :return: scad code
+    """
+    return _SharedModuleRenderer(obj, min_nodes).render(file_header)
+
+
+def write_scad(obj, filepath, file_header="", shared_modules=True, optimize=False):
+    """
+    Write obj to a scad file.
+    :param shared_modules: write repeated subtrees as OpenSCAD modules, see scad_render_shared
+    :param optimize: simplify the tree first, see optimize_csg
+    """
+    if optimize:
+        obj = optimize_csg(obj, name=os.path.basename(filepath))
+    if shared_modules:
+        scad = scad_render_shared(obj, file_header)
+    else:
+        scad = scad_render(obj, file_header)
+    with open(filepath, "w") as f:
+        f.write(scad)
+    return filepath
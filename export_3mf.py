@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Export of several parts into one 3MF file, e.g. a print plate or all parts of the reference assembly.
+
+Unlike STL, a 3MF file holds several named objects, each a list of vertices and triangles referring to them by
+index, in a zip archive. Every part is an object named like the part (e.g. "05 - beamsplitter_mount"), so the names
+show up in the slicer. The vertices of each part are deduplicated (STL stores every vertex once per triangle), and
+parts with identical geometry, like the two cage_circumference, are stored once and referenced by both.
+
+The parts are read and written one after the other, straight into the compressed zip entry, so only one part is in
+memory at a time.
+
+    python export_3mf.py stl/reference_assembly kit.3mf  # all STLs of a directory
+"""
+import argparse
+import hashlib
+import os
+import zipfile
+
+import numpy as np
+
+import stl_tools
+
+_content_types = """<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+ <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+ <Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>
+</Types>
+"""
+_relationships = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+ <Relationship Target="/3D/3dmodel.model" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>
+</Relationships>
+"""
+_model_start = """<?xml version="1.0" encoding="UTF-8"?>
+<model unit="millimeter" xml:lang="en-US" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">
+ <resources>
+"""
+chunk_size = 10000  # vertices or triangles formatted at once
+
+
+def indexed_mesh(triangles):
+    """
+    :param triangles: array of shape (n, 3 vertices, 3 coordinates)
+    :return: (unique vertices (m, 3) float32, triangles (k, 3) of vertex indices); degenerate triangles are dropped
+    """
+    vertices = np.ascontiguousarray(triangles, dtype=np.float32).reshape(-1, 3) + np.float32(0)  # -0 + 0 = 0
+    unique, index = np.unique(vertices.view(np.dtype((np.void, 12))).ravel(), return_inverse=True)
+    index = index.reshape(-1, 3)
+    index = index[(index[:, 0] != index[:, 1]) & (index[:, 1] != index[:, 2]) & (index[:, 2] != index[:, 0])]
+    return unique.view(np.float32).reshape(-1, 3), index
+
+
+def _xml_attribute(text):
+    return str(text).replace("&", "&amp;").replace('"', "&quot;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _transform_attribute(matrix):
+    """3MF transform of a 4x4 matrix: 3MF multiplies row vectors, so the rotation is transposed"""
+    if matrix is None:
+        return ""
+    matrix = np.asarray(matrix, dtype=float)
+    values = np.concatenate([matrix[:3, :3].T.ravel(), matrix[:3, 3]])
+    return ' transform="{}"'.format(" ".join("{:.9g}".format(value) for value in values))
+
+
+def _write_mesh(stream, vertices, triangles):
+    stream.write(b"   <mesh>\n    <vertices>\n")
+    for start in range(0, len(vertices), chunk_size):
+        coordinates = [str(value) for value in vertices[start:start + chunk_size].ravel()]  # shortest exact float32
+        stream.write("".join('     <vertex x="{}" y="{}" z="{}"/>\n'.format(*coordinates[i:i + 3])
+                             for i in range(0, len(coordinates), 3)).encode())
+    stream.write(b"    </vertices>\n    <triangles>\n")
+    for start in range(0, len(triangles), chunk_size):
+        chunk = triangles[start:start + chunk_size].tolist()
+        stream.write("".join('     <triangle v1="{}" v2="{}" v3="{}"/>\n'.format(*triangle)
+                             for triangle in chunk).encode())
+    stream.write(b"    </triangles>\n   </mesh>\n")
+
+
+def write_3mf(path, parts):
+    """
+    Write the parts to a 3MF file.
+    :param parts: iterable of (name, STL file or triangle array, 4x4 matrix placing the part or None); it is read
+                  lazily, one part at a time
+    :return: number of parts
+    """
+    tmp_file = path + ".tmp"
+    build = []  # (object id, transform)
+    object_of_geometry = {}  # hash of the normalized mesh -> object id of its mesh
+    with zipfile.ZipFile(tmp_file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _content_types)
+        archive.writestr("_rels/.rels", _relationships)
+        with archive.open("3D/3dmodel.model", "w", force_zip64=True) as stream:
+            stream.write(_model_start.encode())
+            for name, mesh, matrix in parts:
+                triangles = stl_tools.read_stl(mesh) if isinstance(mesh, (str, os.PathLike)) else mesh
+                key = hashlib.sha256(stl_tools.binary_stl_bytes(stl_tools.normalize(triangles))).hexdigest()
+                object_id = len(build) + 1
+                if key in object_of_geometry:  # a named object made of the stored mesh
+                    stream.write('  <object id="{}" name="{}" type="model">\n   <components>\n'
+                                 '    <component objectid="{}"/>\n   </components>\n  </object>\n'.format(
+                                     object_id, _xml_attribute(name), object_of_geometry[key]).encode())
+                else:
+                    object_of_geometry[key] = object_id
+                    stream.write('  <object id="{}" name="{}" type="model">\n'.format(
+                        object_id, _xml_attribute(name)).encode())
+                    _write_mesh(stream, *indexed_mesh(triangles))
+                    stream.write(b"  </object>\n")
+                build.append((object_id, matrix))
+            stream.write(b" </resources>\n <build>\n")
+            for object_id, matrix in build:
+                stream.write('  <item objectid="{}"{}/>\n'.format(object_id, _transform_attribute(matrix)).encode())
+            stream.write(b" </build>\n</model>\n")
+    os.replace(tmp_file, path)
+    print("exported {} parts ({} different) to {}".format(len(build), len(object_of_geometry), path))
+    return len(build)
+
+
+def write_stl_dir_3mf(stl_dir, path):
+    """write all STL files in stl_dir to one 3MF file, each named like its file"""
+    names = sorted(name for name in os.listdir(stl_dir) if name.lower().endswith(".stl"))
+    return write_3mf(path, ((os.path.splitext(name)[0], os.path.join(stl_dir, name), None) for name in names))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Combine the STL files of a directory into one 3MF file")
+    parser.add_argument("stl_dir")
+    parser.add_argument("output", help="3MF file to write")
+    args = parser.parse_args()
+    write_stl_dir_3mf(args.stl_dir, args.output)
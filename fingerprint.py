@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Fingerprints of parts, for incremental builds.
+
+A part's fingerprint changes whenever anything that may change its geometry changes:
+the part function and its keyword arguments, the source code of every module of this repository the part function
+can reach (e.g. Holmos -> base -> helpers), the geometry settings of the configuration (see config), and the file
+header (resolution) of the scad file.
+"""
+import hashlib
+import inspect
+import os
+import sys
+import types
+
+from config import current_config
+
+_repo_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def _is_repo_module(module):
+    module_file = getattr(module, "__file__", None)
+    if module_file is None:
+        return False
+    return os.path.dirname(os.path.abspath(module_file)) == _repo_dir
+
+
+def reachable_modules(func):
+    """
+    All modules of this repository that func can reach through imports, including its own module.
+    Both "import base" and "from base import sunk_hole" are followed.
+    :return: list of modules, sorted by name
+    """
+    start = sys.modules[func.__module__]
+    found = {start.__name__: start}
+    todo = [start]
+    while todo:
+        module = todo.pop()
+        for value in vars(module).values():
+            if isinstance(value, types.ModuleType):
+                candidate = value
+            else:
+                candidate = sys.modules.get(getattr(value, "__module__", None) or "")
+            if candidate is None or candidate.__name__ in found or not _is_repo_module(candidate):
+                continue
+            found[candidate.__name__] = candidate
+            todo.append(candidate)
+    return [found[name] for name in sorted(found)]
+
+
+def part_fingerprint(part_func, kwargs, header="", options=None, config=None):
+    """
+    hex digest identifying the geometry part_func(**kwargs) will produce
+    :param options: dict of build options that change the generated scad code
+    :param config: HolmosConfig the part is built with, default: the current one
+    """
+    if config is None:
+        config = current_config()
+    sha = hashlib.sha256()
+
+    def add(label, text):
+        sha.update("{}:{}\n".format(label, len(text)).encode())
+        sha.update(text.encode())
+
+    add("func", "{}.{}".format(part_func.__module__, part_func.__qualname__))
+    add("kwargs", repr(sorted(kwargs.items())))
+    add("header", header)
+    add("options", repr(sorted((options or {}).items())))
+    for module in reachable_modules(part_func):
+        add("module " + module.__name__, inspect.getsource(module))
+    add("settings", repr(sorted(config.geometry_settings().items())))
+    return sha.hexdigest()
+
+
+def combined_fingerprint(fingerprints):
+    """fingerprint of something made from several fingerprinted parts, e.g. an assembly"""
+    return hashlib.sha256("\n".join(fingerprints).encode()).hexdigest()
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Collision check of the reference assembly: do any two parts of part_list overlap in place?
+
+1. The envelope (bounding box, see csg_bounds) of every part is computed from its CSG tree, placed at z0 + z.
+   Sorted by their start along the optical axis, only envelopes whose z ranges overlap are compared (sweep and prune),
+   and pairs whose boxes also overlap in x and y are candidates. This needs no openscad, and is fast enough to run
+   after every change of part_list.
+2. For the candidates, the rendered STLs (stl/assembled_parts, see "reference_assembly.py --preview", rendered
+   through the stl cache) are placed in the assembly and tested for intersecting triangles: only the triangles in the
+   overlap of both envelopes, and pairs of them whose boxes overlap, are tested exactly.
+
+   A part completely inside another one has no intersecting triangles: if the surfaces do not cross, a few vertices
+   of each part are tested for being inside the other part (ray parity), and a part inside is reported as interference.
+
+Surfaces that only touch (coplanar faces, an edge on a face) are not counted as interference.
+
+    python interference.py  # exit code 1 if parts interfere, 2 if some candidates could not be checked (no STL)
+    python interference.py --envelopes-only  # only step 1, lists the candidates; exit code 0
+"""
+import argparse
+import os
+
+import numpy as np
+from solid import cube
+
+import csg_bounds
+import stl_tools
+from csg_tools import affine_matrix
+
+eps = 1e-6  # mm, closer surfaces touch but do not intersect
+max_pairs_per_chunk = 4000000
+ray_direction = np.array([1, 2 ** .5 - 1, 3 ** .5 - 1.5])  # inside test: irrational slopes, to miss the edges
+ray_direction /= np.linalg.norm(ray_direction)
+inside_samples = 3  # vertices tested per part, the majority decides (a vertex may touch the other surface)
+
+
+def envelopes(components, z0):
+    """:return: list of the components' bounding boxes in the assembly, see csg_bounds"""
+    result = []
+    for component in components:
+        box = csg_bounds.bounds(component.part_func(assemble=True, **component.kwargs))
+        result.append(None if box is None else box + [0, 0, z0 + component.z])
+    return result
+
+
+def candidate_pairs(boxes, clearance=0.):
+    """
+    pairs (i, j), i < j, of overlapping boxes (or closer than clearance), by sweep and prune along z
+    :param boxes: list of boxes, None for empty parts
+    """
+    order = sorted((i for i, box in enumerate(boxes) if box is not None), key=lambda i: boxes[i][0, 2])
+    active = []
+    pairs = []
+    for i in order:
+        z_start = boxes[i][0, 2]
+        active = [j for j in active if boxes[j][1, 2] + clearance > z_start]
+        pairs.extend(tuple(sorted((i, j))) for j in active if csg_bounds.overlap(boxes[i], boxes[j], clearance))
+        active.append(i)
+    return sorted(pairs)
+
+
+def assembly_matrix(component, z0):
+    """4x4 matrix from the component's STL in stl/assembled_parts to its place in the assembly"""
+    matrix = np.eye(4)
+    matrix[2, 3] = z0 + component.z
+    to_assembly = getattr(component.part_func, "to_assembly", None)
+    if to_assembly is None:  # rendered in assembled orientation
+        return matrix
+    marker = cube()
+    node = to_assembly(marker)
+    while node is not marker:
+        node_matrix = affine_matrix(node)
+        if node_matrix is None or len(node.children) != 1:
+            raise ValueError("to_assembly of {} is not a rigid transform".format(component.part_func.__name__))
+        matrix = matrix @ node_matrix
+        node = node.children[0]
+    return matrix
+
+
+def transform_triangles(triangles, matrix):
+    v = np.asarray(triangles, dtype=np.float64)
+    return v @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def _plane_distances(triangles, other):
+    """distances of the vertices of other to the planes of triangles, pairwise, and the unit normals"""
+    normal = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    length = np.linalg.norm(normal, axis=1, keepdims=True)
+    normal = np.divide(normal, length, out=np.zeros_like(normal), where=length > 0)
+    return np.einsum("ijk,ik->ij", other - triangles[:, None, 0], normal), normal
+
+
+def _interval(projection, distance):
+    """range of the projections of the points where a triangle crosses the other triangle's plane"""
+    low, high = np.full(len(projection), np.inf), np.full(len(projection), -np.inf)
+    for i, j in ((0, 1), (1, 2), (2, 0)):
+        crossing = distance[:, i] * distance[:, j] < 0
+        t = np.divide(distance[:, i], distance[:, i] - distance[:, j], out=np.zeros(len(projection)),
+                      where=crossing)
+        value = projection[:, i] + t * (projection[:, j] - projection[:, i])
+        low, high = np.where(crossing, np.minimum(low, value), low), np.where(crossing, np.maximum(high, value), high)
+        on_plane = np.abs(distance[:, i]) <= eps
+        low = np.where(on_plane, np.minimum(low, projection[:, i]), low)
+        high = np.where(on_plane, np.maximum(high, projection[:, i]), high)
+    return low, high
+
+
+def triangles_intersect(a, b):
+    """
+    pairwise intersection test of triangles a[k] and b[k] (Moeller's interval test)
+    :param a, b: arrays of shape (n, 3 vertices, 3 coordinates)
+    :return: boolean array, True where the triangles cross
+    """
+    distance_b, normal_a = _plane_distances(a, b)
+    distance_a, normal_b = _plane_distances(b, a)
+    # triangles on one side of the other's plane, touching it or in it, do not cross
+    separated = np.zeros(len(a), dtype=bool)
+    for distance in (distance_a, distance_b):
+        separated |= np.all(distance >= -eps, axis=1) | np.all(distance <= eps, axis=1)
+
+    # both triangles cross the line where the planes meet; they intersect if their intervals on it overlap
+    direction = np.cross(normal_a, normal_b)
+    length = np.linalg.norm(direction, axis=1, keepdims=True)
+    direction = np.divide(direction, length, out=np.zeros_like(direction), where=length > 0)
+    low_a, high_a = _interval(np.einsum("ijk,ik->ij", a, direction), distance_a)
+    low_b, high_b = _interval(np.einsum("ijk,ik->ij", b, direction), distance_b)
+    return ~separated & (low_a < high_b - eps) & (low_b < high_a - eps)
+
+
+def _triangles_in(triangles, box):
+    return triangles[np.all(triangles.min(axis=1) <= box[1], axis=1) & np.all(triangles.max(axis=1) >= box[0], axis=1)]
+
+
+def mesh_intersections(triangles_a, triangles_b, region=None):
+    """
+    intersecting triangles of two meshes
+    :param region: only test triangles in this box, e.g. the overlap of the envelopes
+    :return: (number of intersecting triangle pairs, box around the crossing triangles of the first mesh or None)
+    """
+    if region is not None:
+        triangles_a, triangles_b = _triangles_in(triangles_a, region), _triangles_in(triangles_b, region)
+    if len(triangles_a) == 0 or len(triangles_b) == 0:
+        return 0, None
+    low_a, high_a = triangles_a.min(axis=1), triangles_a.max(axis=1)
+    low_b, high_b = triangles_b.min(axis=1), triangles_b.max(axis=1)
+    count, hits = 0, []
+    per_chunk = max(max_pairs_per_chunk // len(triangles_b), 1)
+    for start in range(0, len(triangles_a), per_chunk):
+        stop = start + per_chunk
+        boxes_overlap = np.all((low_a[start:stop, None] <= high_b[None]) & (low_b[None] <= high_a[start:stop, None]),
+                               axis=2)
+        i, j = np.nonzero(boxes_overlap)
+        crossing = triangles_intersect(triangles_a[start + i], triangles_b[j])
+        count += int(crossing.sum())
+        hits.append(triangles_a[start + i[crossing]].reshape(-1, 3))
+    hits = np.concatenate(hits)
+    return count, (np.array([hits.min(axis=0), hits.max(axis=0)]) if len(hits) else None)
+
+
+def points_inside(triangles, points):
+    """
+    :param triangles: closed mesh, array of shape (n, 3 vertices, 3 coordinates)
+    :return: boolean array, True for the points inside the mesh: a ray from them crosses its surface an odd number
+             of times (Moeller-Trumbore ray triangle test)
+    """
+    edge_1, edge_2 = triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]
+    p = np.cross(ray_direction, edge_2)
+    det = np.einsum("ij,ij->i", edge_1, p)
+    valid = np.abs(det) > 1e-12
+    edge_1, edge_2, p, det, start = edge_1[valid], edge_2[valid], p[valid], det[valid], triangles[valid, 0]
+    inside = []
+    for point in np.asarray(points, dtype=np.float64):
+        s = point - start
+        u = np.einsum("ij,ij->i", s, p) / det
+        q = np.cross(s, edge_1)
+        v = q @ ray_direction / det
+        t = np.einsum("ij,ij->i", edge_2, q) / det
+        inside.append(int(np.count_nonzero((u >= 0) & (v >= 0) & (u + v <= 1) & (t > eps))) % 2 == 1)
+    return np.array(inside, dtype=bool)
+
+
+def mesh_inside(triangles_a, triangles_b):
+    """True if the mesh a is inside the mesh b, for meshes whose surfaces do not cross"""
+    if len(triangles_a) == 0 or len(triangles_b) == 0:
+        return False
+    if np.any(triangles_a.min(axis=(0, 1)) < triangles_b.min(axis=(0, 1)) - eps) or \
+            np.any(triangles_a.max(axis=(0, 1)) > triangles_b.max(axis=(0, 1)) + eps):
+        return False
+    samples = triangles_a[np.linspace(0, len(triangles_a) - 1, inside_samples).astype(int), 0]
+    return int(points_inside(triangles_b, samples).sum()) * 2 > len(samples)
+
+
+def check_assembly(components, z0, stl_dir="stl/assembled_parts", clearance=0., envelopes_only=False):
+    """
+    :return: list of dicts, one per candidate pair: parts (names), envelope_overlap (box), and either skipped (why the
+             meshes were not compared: "envelopes only" or "no STL"), or intersections (number of crossing triangle
+             pairs), region (box around them) and inside (name of the part that is inside the other one, if the
+             surfaces do not cross) or None
+    """
+    names = [component.filename(number, "") for number, component in enumerate(components)]
+    boxes = envelopes(components, z0)
+    meshes = {}
+
+    def placed_mesh(number):
+        if number not in meshes:
+            stl_file = os.path.join(stl_dir, components[number].filename(number, ".stl"))
+            meshes[number] = transform_triangles(stl_tools.read_stl(stl_file), assembly_matrix(components[number], z0)) \
+                if os.path.isfile(stl_file) else None
+        return meshes[number]
+
+    results = []
+    for i, j in candidate_pairs(boxes, clearance):
+        region = np.array([np.maximum(boxes[i][0], boxes[j][0]), np.minimum(boxes[i][1], boxes[j][1])])
+        result = {"parts": (names[i], names[j]), "envelope_overlap": region}
+        if envelopes_only:
+            result["skipped"] = "envelopes only"
+        elif placed_mesh(i) is None or placed_mesh(j) is None:
+            result["skipped"] = "no STL"
+        else:
+            result["intersections"], result["region"] = mesh_intersections(placed_mesh(i), placed_mesh(j), region)
+            result["inside"] = None
+            if not result["intersections"]:
+                for inner, outer in ((i, j), (j, i)):
+                    if mesh_inside(placed_mesh(inner), placed_mesh(outer)):
+                        result["inside"], result["region"] = names[inner], boxes[inner]
+        results.append(result)
+    return results
+
+
+def print_report(results):
+    """:return: exit code, 1 if any parts interfere, else 2 if some pairs were not checked for lack of an STL, else 0"""
+    def format_box(box):
+        return " to ".join("({})".format(", ".join("{:.1f}".format(v) for v in corner)) for corner in box)
+
+    interfering = unchecked = False
+    for result in results:
+        print("{} / {}: envelopes overlap in {}".format(*result["parts"], format_box(result["envelope_overlap"])))
+        if "skipped" in result:
+            unchecked |= result["skipped"] != "envelopes only"
+            print("    not checked: {}".format(result["skipped"]))
+        elif result["intersections"]:
+            interfering = True
+            print("    INTERFERENCE: {} crossing triangle pairs in {}".format(result["intersections"],
+                                                                         format_box(result["region"])))
+        elif result["inside"]:
+            interfering = True
+            print("    INTERFERENCE: {} is inside the other part, in {}".format(result["inside"],
+                                                                        format_box(result["region"])))
+        else:
+            print("    clear")
+    print("{} pairs of parts with overlapping envelopes{}{}".format(
+        len(results), ", some interfere" if interfering else "", ", some not checked" if unchecked else ""))
+    return 1 if interfering else 2 if unchecked else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check the parts of the reference assembly for collisions")
+    parser.add_argument("--stl-dir", default="stl/assembled_parts",
+                        help="rendered parts, see reference_assembly.py --preview")
+    parser.add_argument("--clearance", type=float, default=0., help="also report envelopes closer than this, in mm")
+    parser.add_argument("--envelopes-only", action="store_true", help="only compare the bounding boxes")
+    args = parser.parse_args()
+
+    import parts
+    from reference_assembly import part_list, z0
+
+    parts.enable_memo()
+    exit(print_report(check_assembly(part_list, z0, args.stl_dir, args.clearance, args.envelopes_only)))
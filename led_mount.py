@@ -4,6 +4,7 @@ from solid import *
 import base
 from file_tools import safe_mkdir
 from render_stl import render_scad_dir_to_stl_dir
+from resolution import scad_header
 
 
 def hex_led_mount(assemble=True):
@@ -52,16 +53,21 @@ def hex_led_mount(assemble=True):
     return clip + plate
 
 
+# (file name, function without arguments) of the parts written by the __main__ block, also benchmarked (benchmark.py)
+main_parts = [
+    ("hex_led", hex_led_mount),
+]
+
+
 if __name__ == '__main__':
-    header = "$fa = 5;"  # minimum face angle
-    header += "$fs = 0.1;"  # minimum face size
+    header = scad_header()
 
     scad_path = "scad/misc/"
     stl_path = "stl/misc/"
     safe_mkdir(scad_path)
 
-    scad_render_to_file(hex_led_mount(),
-                        scad_path + "hex_led.scad", file_header=header)
+    for name, part_func in main_parts:
+        scad_render_to_file(part_func(), scad_path + name + ".scad", file_header=header)
 
     safe_mkdir(stl_path)
     render_scad_dir_to_stl_dir(scad_path, stl_path)
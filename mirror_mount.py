@@ -14,6 +14,7 @@ from solid import *
 from base import base, sunk_hole, single_rod_clamp
 from file_tools import safe_mkdir
 from helpers import rounded_plate
+from resolution import scad_header
 
 
 def crane_45deg_mirror():
@@ -140,18 +141,19 @@ def crane_mirror_final(intermediate_diam, rod_thick):
     return plate
 
 
+# (file name, function without arguments) of the parts written by the __main__ block, also benchmarked (benchmark.py)
+main_parts = [
+    ("crane_mirror_assembled", lambda: crane_mirror(True)),
+    ("crane_mirror_printable", lambda: crane_mirror(False)),
+    ("crane_mirror_storage", lambda: crane_mirror(False, mirror_offset_x=0, crane_only=True)),
+]
+
+
 if __name__ == '__main__':
 
-    _fine=True
-    if _fine:
-        header = "$fa = 5;"  # minimum face angle
-        header += "$fs = 0.1;"  # minimum face size
-    else:
-        header = ""
+    header = scad_header()
 
     safe_mkdir("scad/misc")
 
-    scad_render_to_file(crane_mirror(True), "scad/misc/crane_mirror_assembled.scad", file_header=header)
-    scad_render_to_file(crane_mirror(False), "scad/misc/crane_mirror_printable.scad", file_header=header)
-    scad_render_to_file(crane_mirror(False, mirror_offset_x=0, crane_only=True), "scad/misc/crane_mirror_storage.scad",
-                        file_header=header)
+    for name, part_func in main_parts:
+        scad_render_to_file(part_func(), "scad/misc/{}.scad".format(name), file_header=header)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Printable parts whose assembled version is the printed part, moved to its place.
+
+Part functions return the part ready to print with assemble=False, and in its place in the microscope with
+assemble=True (see Holmos). For most parts, the two only differ by a rigid transform. Decorating such a part function
+with @printable_part(to_assembly) builds the geometry once, with assemble=False, and assemble=True returns
+to_assembly(printable part):
+
+    @printable_part(lambda mount: rotate((0, 180, 0))(mount))
+    def round_mount_light(inner_diam=17.9, ..., assemble=False):
+
+The transform is available as part_func.to_assembly, e.g. to place the printable STL in an assembly
+(see reference_assembly.holmos_assembly_preview).
+
+While memoization is enabled (enable_memo, or in a "with build_scope():" block), the printable parts are stored by
+function, arguments and the geometry settings of the configuration, so a part used several times in a build,
+e.g. both cage_circumference, is built once. Every call returns a new root node whose children are the stored
+sub-trees. Wrapping the returned part (transforms, "+", "-") sets the parent of that new root only, so the stored part
+stays a root and still subtracts its hole()s when rendered on its own. The sub-trees are shared between calls: do not
+modify them in place (obj.add() on a child).
+"""
+import contextlib
+import copy
+import functools
+import inspect
+import threading
+
+from config import current_config
+
+_memo = None  # (function, arguments, settings) -> printable part, while memoization is enabled
+_lock = threading.Lock()
+
+
+def enable_memo(enabled=True):
+    """memoize printable parts from now on (e.g. for the lifetime of a build process), or stop and forget them"""
+    global _memo
+    _memo = {} if enabled else None
+
+
+@contextlib.contextmanager
+def build_scope():
+    """memoize printable parts inside the with block"""
+    enable_memo()
+    try:
+        yield
+    finally:
+        enable_memo(False)
+
+
+def _identity(obj):
+    return obj
+
+
+def printable_part(to_assembly=None):
+    """
+    decorator for part functions that take "assemble", and whose assembled version is the printable one moved by
+    to_assembly
+    :param to_assembly: function that places the printable part in the assembly, default: it is in place already
+    """
+    if to_assembly is None:
+        to_assembly = _identity
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            assemble = bound.arguments.pop("assemble", False)
+            printable = _build(func, bound.arguments)
+            return to_assembly(printable) if assemble else printable
+
+        wrapper.to_assembly = to_assembly
+        return wrapper
+
+    return decorator
+
+
+def _new_root(obj):
+    """copy of the root node of obj, with the same children; solidpython subtracts hole()s only at nodes without
+    parent (or part roots), so the stored part must never be added to another node"""
+    root = copy.copy(obj)
+    root.children = list(obj.children)
+    root.params = dict(obj.params)
+    root.parent = None
+    return root
+
+
+def _build(func, arguments):
+    """func(assemble=False, **arguments), from the memo if possible"""
+    memo = _memo
+    if memo is None:
+        return func(assemble=False, **arguments)
+
+    key = ("{}.{}".format(func.__module__, func.__qualname__), repr(sorted(arguments.items())),
+           repr(sorted(current_config().geometry_settings().items())))
+    with _lock:
+        if key in memo:
+            return _new_root(memo[key])
+    printable = func(assemble=False, **arguments)
+    with _lock:
+        return _new_root(memo.setdefault(key, printable))
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Arrange the printable parts of the reference assembly on as few print plates as possible.
+
+The footprint of every part is the bounding box of its rendered STL (stl/reference_assembly), or, for parts that
+are not rendered, its bounding box computed from the CSG tree (see csg_bounds), grown by plate_spacing_mm.
+The footprints are placed with the MaxRects heuristic: the largest parts first, each at the free rectangle of any
+plate that it fills best (best short side fit), rotated by 90 degrees if that fits better; a new plate is only
+started if a part fits on none. Bed size and spacing are bed_size_mm and plate_spacing_mm in global_settings.ini.
+
+Every plate is written as scad/plates/plate_N.scad (the parts' CSG, placed), and as stl/plates/plate_N.stl, combined
+from the rendered parts if all of them are rendered, else rendered from the scad file (if openscad is found).
+Combined plates are also written as stl/plates/plate_N.3mf, with every part as a named object (see export_3mf).
+plates.json in the stl directory lists the parts of each plate, with position and rotation.
+
+    python plate_packing.py
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+from solid import rotate, translate, union
+
+import csg_bounds
+import export_3mf
+import render_stl
+import resolution
+import stl_tools
+from config import current_config
+from csg_tools import write_scad
+from file_tools import safe_mkdir
+
+
+class PlateItem:
+    def __init__(self, name, part, box, stl_file=None):
+        """
+        :param part: printable part (solidpython object)
+        :param box: bounding box of the part, see csg_bounds
+        :param stl_file: rendered part, or None
+        """
+        self.name = name
+        self.part = part
+        self.box = np.asarray(box, dtype=float)
+        self.stl_file = stl_file
+        self.x = self.y = 0.  # position of the footprint's corner on the plate
+        self.rotated = False  # by 90 degrees about z
+
+    def footprint(self):
+        size = csg_bounds.size(self.box)
+        return (size[1], size[0]) if self.rotated else (size[0], size[1])
+
+    def matrix(self):
+        """4x4 matrix from the printable part to its place on the plate, standing on z = 0"""
+        matrix = np.eye(4)
+        low = self.box[0]
+        if self.rotated:  # (x, y) -> (-y, x)
+            matrix[:2, :2] = [[0, -1], [1, 0]]
+            low = np.array([-self.box[1, 1], self.box[0, 0], self.box[0, 2]])
+        matrix[:3, 3] = [self.x - low[0], self.y - low[1], -low[2]]
+        return matrix
+
+    def placed_part(self):
+        offset = self.matrix()[:3, 3]
+        return translate(offset.tolist())(rotate((0, 0, 90))(self.part) if self.rotated else self.part)
+
+
+def _fits(width, height, rect):
+    return width <= rect[2] and height <= rect[3]
+
+
+def _split(free, placed):
+    """free rectangles (x, y, width, height) left after placing the rectangle placed, the largest possible ones"""
+    x, y, w, h = placed
+    result = []
+    for fx, fy, fw, fh in free:
+        if x >= fx + fw or x + w <= fx or y >= fy + fh or y + h <= fy:
+            result.append((fx, fy, fw, fh))
+            continue
+        if x > fx:
+            result.append((fx, fy, x - fx, fh))
+        if x + w < fx + fw:
+            result.append((x + w, fy, fx + fw - x - w, fh))
+        if y > fy:
+            result.append((fx, fy, fw, y - fy))
+        if y + h < fy + fh:
+            result.append((fx, y + h, fw, fy + fh - y - h))
+    # drop rectangles contained in another one
+    return [a for i, a in enumerate(result)
+            if not any(j != i and b[0] <= a[0] and b[1] <= a[1] and a[0] + a[2] <= b[0] + b[2] and
+                       a[1] + a[3] <= b[1] + b[3] and (b != a or j < i) for j, b in enumerate(result))]
+
+
+def pack(items, bed_size_mm=None, spacing=None):
+    """
+    place the items on plates, see module docstring; sets x, y and rotated of every item
+    :return: (list of plates, each a list of items; list of items too large for the printer)
+    """
+    config = current_config()
+    bed = np.asarray(bed_size_mm if bed_size_mm is not None else config.bed_size_mm, dtype=float)
+    spacing = config.plate_spacing_mm if spacing is None else spacing
+    # every footprint is grown by the spacing, and so is the bed, so that parts may touch its edges
+    plate_rect = (0., 0., bed[0] + spacing, bed[1] + spacing)
+
+    plates, free_rects, too_large = [], [], []
+    for item in sorted(items, key=lambda item: -np.prod(item.footprint())):
+        if csg_bounds.size(item.box)[2] > bed[2]:
+            too_large.append(item)
+            continue
+        best = None  # (score, plate, free rectangle, rotated)
+        for rotated in (False, True):
+            item.rotated = rotated
+            width, height = (side + spacing for side in item.footprint())
+            for plate, rects in enumerate(free_rects + [[plate_rect]]):
+                for rect in rects:
+                    if _fits(width, height, rect):
+                        left_over = sorted((rect[2] - width, rect[3] - height))
+                        score = (plate == len(free_rects), left_over)  # prefer plates that are started already
+                        if best is None or score < best[0]:
+                            best = (score, plate, rect, rotated)
+        if best is None:
+            too_large.append(item)
+            continue
+        _, plate, rect, item.rotated = best
+        if plate == len(free_rects):
+            plates.append([])
+            free_rects.append([plate_rect])
+        item.x, item.y = rect[0], rect[1]
+        width, height = (side + spacing for side in item.footprint())
+        free_rects[plate] = _split(free_rects[plate], (item.x, item.y, width, height))
+        plates[plate].append(item)
+    return plates, too_large
+
+
+def reference_items(stl_path="stl/reference_assembly", use_stl=True):
+    """PlateItems of the printable parts of the reference assembly, with STL footprints where they are rendered"""
+    from reference_assembly import part_list
+
+    items = []
+    for number, component in enumerate(part_list):
+        part = component.part_func(assemble=False, **component.kwargs)
+        stl_file = os.path.join(stl_path, component.filename(number, ".stl"))
+        if use_stl and os.path.isfile(stl_file):
+            stats = stl_tools.stl_stats(stl_file)
+            box = [stats["bbox_min"], stats["bbox_max"]]
+        else:
+            stl_file, box = None, csg_bounds.bounds(part)
+        items.append(PlateItem(component.filename(number, ""), part, box, stl_file))
+    return items
+
+
+def write_plates(plates, scad_path="scad/plates", stl_path="stl/plates", jobs=None, use_cache=True, backend=None):
+    """write the scad and STL files of the plates and stl_path/plates.json, see module docstring"""
+    safe_mkdir(scad_path, stl_path)
+    for path in (scad_path, stl_path):  # plates of an earlier, larger packing
+        for file in os.listdir(path):
+            if file.startswith("plate_"):
+                os.remove(os.path.join(path, file))
+    header = resolution.scad_header()
+    to_render = []
+    layout = {}
+    for number, plate in enumerate(plates, 1):
+        scad_file = os.path.join(scad_path, "plate_{}.scad".format(number))
+        stl_file = os.path.join(stl_path, "plate_{}.stl".format(number))
+        write_scad(union()(*[item.placed_part() for item in plate]), scad_file, file_header=header)
+        print("generated", scad_file)
+        if all(item.stl_file is not None for item in plate):
+            triangles = [stl_tools.read_stl(item.stl_file).astype(np.float64) @ item.matrix()[:3, :3].T +
+                         item.matrix()[:3, 3] for item in plate]
+            stl_tools.write_binary_stl(stl_file, np.concatenate(triangles).astype(np.float32))
+            print("combined", stl_file)
+            export_3mf.write_3mf(os.path.splitext(stl_file)[0] + ".3mf",
+                                 ((item.name, item.stl_file, item.matrix()) for item in plate))
+        else:
+            to_render.append((scad_file, stl_file))
+        layout[os.path.basename(stl_file)] = [{"part": item.name, "x": round(item.x, 3), "y": round(item.y, 3),
+                                               "rotated": item.rotated} for item in plate]
+
+    if to_render and os.path.isfile(render_stl.path_to_openscad()):
+        render_stl.render_scad_stream(iter(to_render), jobs, use_cache, backend)
+    elif to_render:
+        print("could not find openscad at {}, only the scad files of some plates are written".format(
+            render_stl.path_to_openscad()))
+    with open(os.path.join(stl_path, "plates.json"), "w") as f:
+        json.dump(layout, f, indent=1)
+
+
+def print_plates(plates, too_large):
+    for number, plate in enumerate(plates, 1):
+        print("plate {}: {}".format(number, ", ".join(item.name + (" (rotated)" if item.rotated else "")
+                                                      for item in plate)))
+    for item in too_large:
+        print("warning: {} does not fit on the printer".format(item.name))
+    print("{} parts on {} plates".format(sum(len(plate) for plate in plates), len(plates)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Arrange the parts of the reference assembly on print plates")
+    parser.add_argument("--stl-dir", default="stl/reference_assembly", help="rendered parts, for their footprints")
+    parser.add_argument("--from-csg", action="store_true",
+                        help="footprints from the CSG trees only, and render the plates from their scad files")
+    parser.add_argument("--spacing", type=float, default=None, help="gap between parts in mm "
+                                                                    "(default: see global_settings.ini)")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="number of concurrent openscad processes")
+    parser.add_argument("--no-cache", action="store_true", help="render all plates, even if a cached stl exists")
+    args = parser.parse_args()
+
+    import parts
+
+    parts.enable_memo()
+    plates, too_large = pack(reference_items(args.stl_dir, not args.from_csg), spacing=args.spacing)
+    print_plates(plates, too_large)
+    write_plates(plates, jobs=args.jobs, use_cache=not args.no_cache)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Opt-in instrumentation of the part functions, to find slow or redundant geometry construction.
+
+When installed, every function of the part modules (Holmos, cage, mirror_mount, round_mounts, led_mount, base,
+helpers) is wrapped. For each call path (e.g. reference_assembly -> cage.cage_circumference -> cage.cage_3_clips
+-> base.single_rod_clamp) the profiler records
+- the number of calls, and how many of them repeated arguments already seen (redundant: same geometry built again)
+- cumulative time
+- CSG nodes of the returned object, in total and without the nodes returned by the functions it called
+
+Enabled by the HOLMOS_PROFILING environment variable or --profile-parts in reference_assembly.py.
+Run this file to profile holmos_full_assembly().
+"""
+import functools
+import importlib
+import inspect
+import os
+import threading
+import time
+
+from solid import OpenSCADObject
+
+from csg_tools import count_nodes
+
+part_modules = ("Holmos", "cage", "mirror_mount", "round_mounts", "led_mount", "base", "helpers")
+
+
+def enabled_by_env():
+    return os.environ.get("HOLMOS_PROFILING", "") not in ("", "0")
+
+
+class _CallNode:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.
+        self.nodes = 0  # CSG nodes returned, summed over all calls
+        self.own_nodes = 0  # ...without those returned by called part functions
+        self.arguments = set()  # distinct arguments seen
+        self.children = {}  # name -> _CallNode
+
+    @property
+    def redundant_calls(self):
+        return self.calls - len(self.arguments)
+
+
+class PartProfiler:
+    def __init__(self):
+        self.root = _CallNode("<total>")
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._wrappers = {}  # original function -> wrapper
+        self._patched = []  # (namespace object, attribute, original value), for uninstall
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = [[self.root, 0]]  # [call node, CSG nodes returned by its callees]
+        return self._local.stack
+
+    def instrument(self, func):
+        """wrapper of func that records its calls; the same wrapper for every call with the same func"""
+        if func in self._wrappers or func in self._wrappers.values():
+            return self._wrappers.get(func, func)
+
+        name = "{}.{}".format(func.__module__, func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = self._stack()
+            with self._lock:
+                node = stack[-1][0].children.setdefault(name, _CallNode(name))
+            stack.append([node, 0])
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                _, callee_nodes = stack.pop()
+
+            nodes = count_nodes(result) if isinstance(result, OpenSCADObject) else 0
+            with self._lock:
+                node.calls += 1
+                node.seconds += seconds
+                node.nodes += nodes
+                node.own_nodes += max(nodes - callee_nodes, 0)
+                node.arguments.add(_arguments_key(args, kwargs))
+                stack[-1][1] += nodes
+            return result
+
+        self._wrappers[func] = wrapper
+        return wrapper
+
+    def install(self, module_names=part_modules, components=()):
+        """
+        Replace all functions defined in module_names by instrumented versions, wherever they were imported to.
+        :param components: objects with a part_func attribute, e.g. reference_assembly.part_list
+        """
+        modules = [importlib.import_module(name) for name in module_names]
+        for module in modules:
+            for attribute, value in list(vars(module).items()):
+                if inspect.isfunction(value) and value.__module__ in module_names:
+                    self._patch(module, attribute, value)
+        for component in components:
+            if inspect.isfunction(component.part_func) and component.part_func.__module__ in module_names:
+                self._patch(component, "part_func", component.part_func)
+
+    def _patch(self, namespace, attribute, func):
+        self._patched.append((namespace, attribute, func))
+        setattr(namespace, attribute, self.instrument(func))
+
+    def uninstall(self):
+        for namespace, attribute, original in reversed(self._patched):
+            setattr(namespace, attribute, original)
+        self._patched = []
+
+    def report(self):
+        """text report: totals per function, then the call tree"""
+        totals = {}
+
+        def collect(node):
+            for child in node.children.values():
+                total = totals.setdefault(child.name, _CallNode(child.name))
+                total.calls += child.calls
+                total.seconds += child.seconds
+                total.nodes += child.nodes
+                total.own_nodes += child.own_nodes
+                total.arguments |= child.arguments
+                collect(child)
+        collect(self.root)
+
+        row = "{:>7} {:>9} {:>10} {:>9} {:>9}  {}"
+        lines = ["per function (time includes called functions):",
+                 row.format("calls", "redundant", "cum [ms]", "nodes", "own nodes", "function")]
+        for total in sorted(totals.values(), key=lambda t: -t.calls):
+            lines.append(row.format(total.calls, total.redundant_calls, "{:.1f}".format(1000 * total.seconds),
+                                    total.nodes, total.own_nodes, total.name))
+
+        lines += ["", "call tree:", row.format("calls", "redundant", "cum [ms]", "nodes", "own nodes", "function")]
+
+        def tree(node, depth):
+            for child in sorted(node.children.values(), key=lambda c: -c.seconds):
+                lines.append(row.format(child.calls, child.redundant_calls, "{:.1f}".format(1000 * child.seconds),
+                                        child.nodes, child.own_nodes, "  " * depth + child.name))
+                tree(child, depth + 1)
+        tree(self.root, 0)
+        return "\n".join(lines)
+
+
+def _arguments_key(args, kwargs):
+    """hashable representation of call arguments; CSG objects by identity, they are too large to compare"""
+    def key(value):
+        if isinstance(value, OpenSCADObject):
+            return "<{} {}>".format(value.name, id(value))
+        if isinstance(value, (list, tuple)):
+            return tuple(key(v) for v in value)
+        return repr(value)
+    return key(args), tuple(sorted((name, key(value)) for name, value in kwargs.items()))
+
+
+if __name__ == '__main__':
+    import reference_assembly
+
+    profiler = PartProfiler()
+    profiler.install(components=reference_assembly.part_list)
+    reference_assembly.holmos_full_assembly()
+    print(profiler.report())
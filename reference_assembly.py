@@ -11,6 +11,9 @@ The STL files are added by manually copying ./stl/reference_assembly to ./
 This way, they are not accidentally updated; the compiled STL files should only be updated on milestones, keeping the
 git repository small.
 """
+import argparse
+import atexit
+import json
 import os
 
 from solid import *
@@ -19,8 +22,18 @@ import Holmos
 import cage
 import round_mounts
 import mirror_mount
+import parts
+import profiling
+import render_stl
+import resolution
+import stl_tools
+import subpart_cache
+from config import current_config
+from csg_tools import write_scad
 from file_tools import safe_mkdir
-from render_stl import render_scad_dir_to_stl_dir, print_git_info_to_dir
+from fingerprint import part_fingerprint, combined_fingerprint
+from render_history import print_build_estimate
+from render_stl import render_scad_stream, print_git_info_to_dir, benchmark_backends, generate_scad_files
 
 
 class HolmosComponent:
@@ -30,6 +43,13 @@ class HolmosComponent:
         self.name = name
         self.kwargs = kwargs  # keyword arguments for part_func
 
+    def filename(self, number, extension=".scad"):
+        """file name of this component as number'th part of the reference assembly"""
+        name_for_fn = self.name
+        if name_for_fn is None:
+            name_for_fn = self.part_func.__name__
+        return "{:02d} - {}{}".format(number, name_for_fn, extension)
+
 
 mount_bottom = False  # mount at bottom (screw into something) or top (hang from something)
 h = 600
@@ -65,35 +85,263 @@ def holmos_full_assembly():
     return assembly
 
 
+part_colors = ("SteelBlue", "Orange", "ForestGreen", "Crimson", "Gold", "MediumPurple", "Teal", "Chocolate")
+
+
+def holmos_assembly_preview(stl_files, scad_dir):
+    """
+    The assembly from the rendered STLs of the parts: every part is an import(), placed at its z and coloured,
+    without a union, so that openscad neither evaluates the parts' CSG again nor unites them.
+    :param stl_files: STL of every part in part_list: the printable STL for parts that declare their assembly
+                      transform (see parts.printable_part), else the assembled one (see write_assembled_part_scad)
+    :param scad_dir: directory of the scad file, the import() paths are relative to it
+    """
+    assembly = part()(color("Silver")(translate((15, -25, h/2))(cylinder(d=6, h=h, center=True))))
+    for number, (component, stl_file) in enumerate(zip(part_list, stl_files)):
+        stl_relative = os.path.relpath(stl_file, scad_dir).replace("\\", "/")
+        to_assembly = getattr(component.part_func, "to_assembly", None) or (lambda obj: obj)
+        assembly.add(color(part_colors[number % len(part_colors)])(
+            translate((0, 0, z0+component.z))(to_assembly(import_(stl_relative)))))
+    return assembly
+
+
+def write_assembled_part_scad(number, scad_file, header, optimize=False):
+    """write part_list[number] in its assembled orientation, for holmos_assembly_preview, to scad_file"""
+    part = part_list[number]
+    write_scad(part.part_func(assemble=True, **part.kwargs), scad_file, file_header=header, optimize=optimize)
+    print("generated", scad_file)
+    return scad_file
+
+
+def build_preview(scad_path, stl_path, header, jobs=None, use_cache=True, backend=None, generation_workers=None,
+                  optimize=False, prerender_subparts=False, log_file=None, memory_limit_mb=None, timeout=None):
+    """
+    Render the parts to stl_path (through the stl cache), and write scad/reference_assembly_preview.scad, which
+    shows them in place without evaluating any CSG. Parts with an assembly transform are rendered printable, i.e.
+    the same STL as in the build, others in assembled orientation.
+    :param prerender_subparts: import pre-rendered sub-parts, also in the generation workers (see subpart_cache)
+    :param log_file: JSON lines file for the render events, see render_engine
+    :param memory_limit_mb: kill and retry renders using more memory
+    :param timeout: kill and retry renders taking longer, in seconds
+    """
+    if not os.path.isfile(render_stl.path_to_openscad()):
+        print("could not find openscad at {}, the preview needs the rendered parts".format(
+            render_stl.path_to_openscad()))
+        return
+    safe_mkdir(scad_path, stl_path)
+    tasks = [(os.path.join(stl_path, part.filename(number, ".stl")),
+              write_part_scad if hasattr(part.part_func, "to_assembly") else write_assembled_part_scad,
+              (number, os.path.join(scad_path, part.filename(number)), header, optimize))
+             for number, part in enumerate(part_list)]
+    render_scad_stream(generate_scad_files(tasks, header, generation_workers, prerender_subparts), jobs, use_cache,
+                       backend, log_file, memory_limit_mb, timeout)
+
+    preview_file = "scad/reference_assembly_preview.scad"
+    write_scad(holmos_assembly_preview([stl_file for stl_file, _, _ in tasks], os.path.dirname(preview_file)),
+               preview_file, file_header=header, shared_modules=False)
+    print("generated", preview_file)
+
+
+def write_part_scad(number, scad_file, header, optimize=False):
+    """write the printable version of part_list[number] to scad_file"""
+    part = part_list[number]
+    write_scad(part.part_func(assemble=False, **part.kwargs), scad_file, file_header=header, optimize=optimize)
+    print("generated", scad_file)
+    return scad_file
+
+
+def write_assembly_scad(scad_file, header, optimize=False):
+    write_scad(holmos_full_assembly(), scad_file, file_header=header, optimize=optimize)
+    print("generated", scad_file)
+    return scad_file
+
+
+def build_incremental(scad_path, stl_path, header, jobs=None, use_cache=True, options=None, backend=None,
+                      generation_workers=None, log_file=None, memory_limit_mb=None, timeout=None):
+    """
+    Regenerate and render only parts whose fingerprint changed since the last build.
+    Outputs of parts that are no longer in part_list are removed, everything else is left alone.
+    :param options: dict of build options that change the scad code, part of the fingerprint
+    :param generation_workers: processes for scad generation, see generate_scad_files
+    :param log_file: JSON lines file for the render events, see render_engine
+    :param memory_limit_mb: kill and retry renders using more memory
+    :param timeout: kill and retry renders taking longer, in seconds
+    """
+    optimize = (options or {}).get("optimize", False)
+    fingerprints_file = os.path.join(scad_path, "fingerprints.json")
+    old_fingerprints = {}
+    if os.path.isfile(fingerprints_file):
+        with open(fingerprints_file) as f:
+            old_fingerprints = json.load(f)
+
+    fingerprints = {}
+    to_generate = []
+    to_render = []  # unchanged parts without stl
+    for number, part in enumerate(part_list):
+        filename = part.filename(number)
+        scad_file = os.path.join(scad_path, filename)
+        stl_file = os.path.join(stl_path, part.filename(number, ".stl"))
+        fingerprints[filename] = part_fingerprint(part.part_func, part.kwargs, header, options)
+
+        if fingerprints[filename] != old_fingerprints.get(filename) or not os.path.isfile(scad_file):
+            print("changed:", filename)
+            to_generate.append((stl_file, write_part_scad, (number, scad_file, header, optimize)))
+        elif not os.path.isfile(stl_file):
+            to_render.append((scad_file, stl_file))
+
+    assembly_file = "scad/reference_assembly.scad"
+    placement = repr([(h, z0)] + [(part.z, part.name) for part in part_list])
+    assembly_fingerprint = combined_fingerprint(list(fingerprints.values()) + [placement])
+    if assembly_fingerprint != old_fingerprints.get(assembly_file) or not os.path.isfile(assembly_file):
+        to_generate.append((None, write_assembly_scad, (assembly_file, header, optimize)))
+    fingerprints[assembly_file] = assembly_fingerprint
+
+    expected_stems = {os.path.splitext(filename)[0] for filename in fingerprints}
+    for path, extension in ((scad_path, ".scad"), (stl_path, ".stl")):
+        for file in os.listdir(path):
+            stem, file_extension = os.path.splitext(file)
+            if file_extension == extension and stem not in expected_stems:
+                print("removing stale", file)
+                os.remove(os.path.join(path, file))
+
+    n_render = len(to_render) + sum(stl_file is not None for stl_file, _, _ in to_generate)
+    print("{} of {} parts need rendering".format(n_render, len(part_list)))
+    print_git_info_to_dir(stl_path)
+
+    generated = generate_scad_files(to_generate, header, generation_workers,
+                                    (options or {}).get("prerender_subparts", False))
+    if not os.path.isfile(render_stl.path_to_openscad()):
+        print("could not find openscad at {} - please install opensacd and edit the path in global_settings.ini"
+              .format(render_stl.path_to_openscad()))
+        list(generated)
+        return  # no fingerprints: the next build renders the parts
+
+    def file_pairs():
+        yield from to_render
+        yield from generated
+    render_scad_stream(file_pairs(), jobs, use_cache, backend, log_file, memory_limit_mb, timeout)
+    stl_tools.store_stl_dir(stl_path)
+
+    # written last: if generation fails, the next build tries again
+    with open(fingerprints_file, "w") as f:
+        json.dump(fingerprints, f, indent=1)
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate the reference assembly and render all parts to STL")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="number of concurrent openscad processes (default: number of cores)")
+    parser.add_argument("--generation-jobs", type=int, default=None,
+                        help="number of processes generating scad files (default: number of cores, 0: no extra "
+                             "processes)")
+    parser.add_argument("--no-cache", action="store_true", help="render all parts, even if a cached stl exists")
+    parser.add_argument("--incremental", "-i", action="store_true",
+                        help="only regenerate parts that changed since the last build")
+    parser.add_argument("--prerender-subparts", action="store_true",
+                        help="render rod clamps and cage clips once, and import() the STLs into the parts")
+    parser.add_argument("--optimize", action="store_true",
+                        help="simplify the CSG trees before writing them, and report the node counts")
+    parser.add_argument("--resolution", choices=sorted(resolution.PROFILES), default=None,
+                        help="resolution profile (default: see global_settings.ini)")
+    parser.add_argument("--backend", choices=("auto", "cgal", "manifold"), default=None,
+                        help="openscad geometry backend (default: see global_settings.ini)")
+    parser.add_argument("--memory-limit", type=int, default=None, metavar="MB",
+                        help="kill and retry openscad processes using more memory (default: see global_settings.ini)")
+    parser.add_argument("--timeout", type=int, default=None, metavar="SECONDS",
+                        help="kill and retry openscad processes running longer (default: see global_settings.ini)")
+    parser.add_argument("--render-log", default=None,
+                        help="append render events (queued, started, finished, failed, cache-hit) to this JSON "
+                             "lines file")
+    parser.add_argument("--profile-parts", action="store_true",
+                        help="record calls, time and CSG nodes of all part functions, and print a report at the end "
+                             "(same as setting HOLMOS_PROFILING=1)")
+    parser.add_argument("--preview", action="store_true",
+                        help="only render the parts in assembled orientation, and write an assembly that imports "
+                             "their STLs (scad/reference_assembly_preview.scad)")
+    parser.add_argument("--estimate", action="store_true",
+                        help="only generate the scad files, and estimate how long rendering them will take")
+    parser.add_argument("--3mf", dest="export_3mf", action="store_true",
+                        help="also write all rendered parts to stl/reference_assembly.3mf, one named object per part")
+    parser.add_argument("--benchmark-backends", action="store_true",
+                        help="render each part with every backend openscad supports, and compare time, memory "
+                             "and triangle count")
+    args = parser.parse_args()
 
-    _fine = True
-    if _fine:
-        header = "$fa = 5;"  # minimum face angle
-        header += "$fs = 0.1;"  # minimum face size
-    else:
-        header = ""
+    if args.resolution is not None:
+        resolution.set_profile(args.resolution)
+    header = resolution.scad_header()
+
+    generation_jobs = args.generation_jobs
+    if args.profile_parts or profiling.enabled_by_env():
+        profiler = profiling.PartProfiler()
+        profiler.install(components=part_list)
+        atexit.register(lambda: print(profiler.report()))
+        generation_jobs = 0  # the profiler only sees calls in this process
 
     scad_path = "scad/reference_assembly"
     stl_path = "stl/reference_assembly"
     safe_mkdir(scad_path, stl_path)
 
-    scad_render_to_file(holmos_full_assembly(), "scad/reference_assembly.scad", file_header=header)
+    if args.prerender_subparts:
+        subpart_cache.enable(file_header=header)
+    parts.enable_memo()
+
+    if args.benchmark_backends:
+        benchmark_path = "stl/backend_benchmark"
+        safe_mkdir(benchmark_path)
+        file_pairs = []
+        for number, part in enumerate(part_list):
+            scad_file = os.path.join(scad_path, part.filename(number))
+            write_scad(part.part_func(assemble=False, **part.kwargs), scad_file, file_header=header,
+                       optimize=args.optimize)
+            file_pairs.append((scad_file, os.path.join(benchmark_path, part.filename(number, ".stl"))))
+        benchmark_backends(file_pairs)
+        exit()
+
+    if args.preview:
+        build_preview("scad/assembled_parts", "stl/assembled_parts", header, jobs=args.jobs,
+                      use_cache=not args.no_cache, backend=args.backend, generation_workers=generation_jobs,
+                      optimize=args.optimize, prerender_subparts=args.prerender_subparts, log_file=args.render_log,
+                      memory_limit_mb=args.memory_limit, timeout=args.timeout)
+        exit()
+
+    if args.estimate:
+        tasks = [(os.path.join(stl_path, part.filename(number, ".stl")), write_part_scad,
+                  (number, os.path.join(scad_path, part.filename(number)), header, args.optimize))
+                 for number, part in enumerate(part_list)]
+        file_pairs = list(generate_scad_files(tasks, header, generation_jobs, args.prerender_subparts))
+        print_build_estimate(sorted(file_pairs), jobs=args.jobs, use_cache=not args.no_cache, backend=args.backend)
+        exit()
+
+    if args.incremental:
+        build_incremental(scad_path, stl_path, header, jobs=args.jobs, use_cache=not args.no_cache,
+                          options={"prerender_subparts": args.prerender_subparts, "optimize": args.optimize},
+                          backend=args.backend, generation_workers=generation_jobs, log_file=args.render_log,
+                          memory_limit_mb=args.memory_limit, timeout=args.timeout)
+        if args.export_3mf:
+            render_stl.export_stl_dir_to_3mf(stl_path, "stl/reference_assembly.3mf")
+        exit()
 
     print("cleaning output dirs...")
     for file in os.listdir(scad_path):
         os.remove(os.path.join(scad_path, file))
     for file in os.listdir(stl_path):
         os.remove(os.path.join(stl_path, file))
-
-    for number, part in enumerate(part_list):
-        name_for_fn = part.name
-        if name_for_fn is None:
-            name_for_fn = part.part_func.__name__
-        filename = "{:02d} - {}.scad".format(number, name_for_fn)
-        print(filename)
-        part_scad = part.part_func(assemble=False, **part.kwargs)
-        scad_render_to_file(part_scad, os.path.join(scad_path, filename), file_header=header)
-
     print_git_info_to_dir(stl_path)
-    render_scad_dir_to_stl_dir(scad_path, stl_path)
+
+    # one generation task per part plus the assembly; each part is rendered as soon as its scad file is written
+    tasks = [(os.path.join(stl_path, part.filename(number, ".stl")), write_part_scad,
+              (number, os.path.join(scad_path, part.filename(number)), header, args.optimize))
+             for number, part in enumerate(part_list)]
+    tasks.append((None, write_assembly_scad, ("scad/reference_assembly.scad", header, args.optimize)))
+    file_pairs = generate_scad_files(tasks, header, generation_jobs, args.prerender_subparts)
+    if os.path.isfile(render_stl.path_to_openscad()):
+        render_scad_stream(file_pairs, jobs=args.jobs, use_cache=not args.no_cache, backend=args.backend,
+                           log_file=args.render_log, memory_limit_mb=args.memory_limit, timeout=args.timeout)
+        stl_tools.store_stl_dir(stl_path)
+        if args.export_3mf:
+            render_stl.export_stl_dir_to_3mf(stl_path, "stl/reference_assembly.3mf")
+    else:
+        print("could not find openscad at {} - please install opensacd and edit the path in global_settings.ini"
+              .format(render_stl.path_to_openscad()))
+        list(file_pairs)
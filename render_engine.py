@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Asyncio engine that runs the openscad processes of a build.
+
+Every render job emits events, as dicts with at least "event", "time", "scad" and "stl":
+- queued: the job was submitted
+- cache-hit: the stl was taken from the stl cache
+- started: openscad was started ("backend")
+- finished: openscad succeeded ("return_code", "seconds", "stdout", "stderr")
+- failed: openscad failed (same keys, and "retry" if it is run again with another backend)
+- killed: openscad was killed ("reason": memory limit, timeout or low memory), "retry" if it is tried again later
+Events after the first start also contain "eta", the estimated seconds until all submitted jobs are done, from the
+render history (see render_history). Events go to a callback (print_event by default) and, optionally, a JSON lines log.
+
+    with RenderEngine(jobs=4, log_file="render_log.jsonl") as engine:
+        return_codes = asyncio.run(engine.render([(scad_file, stl_file), ...]))
+
+render() also takes a generator or async generator, so jobs can be submitted while earlier ones are running.
+Of the waiting jobs, the one with the longest estimated render time starts first, so that the expensive parts do not
+end up running alone at the end of the build. While pairs are streamed in, no job starts until no new pair has arrived
+for settle_seconds, so that the scad files generated in one burst are also started longest first.
+
+On linux, the engine samples the memory of every openscad process from /proc, and only starts another one if
+MemAvailable stays above memory_reserve_mb, counting the memory the running processes are expected to grow to (their
+estimated peak). If memory runs low anyway, the most recently started process is killed. Processes exceeding
+job_memory_limit_mb or job_timeout (see global_settings.ini) are killed as well. Killed jobs are tried again after all
+other jobs, with half as many concurrent processes.
+"""
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import time
+
+import render_history
+import render_stl
+import stl_cache
+from config import current_config
+
+
+def process_rss_kb(pid):
+    """current resident memory of process pid in kB, from /proc (linux only). None if unknown."""
+    try:
+        with open("/proc/{}/status".format(pid)) as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def available_memory_kb():
+    """memory available for new processes without swapping, in kB, from /proc/meminfo (linux only). None if unknown."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class _Job:
+    def __init__(self, scad_file, stl_file, estimate, expected_rss_kb):
+        self.scad_file = scad_file
+        self.stl_file = stl_file
+        self.estimate = estimate
+        self.expected_rss_kb = expected_rss_kb
+        self.started = None  # time.monotonic() when openscad started
+        self.done = False
+        self.rss_kb = 0
+        self.peak_rss_kb = None
+        self.killed = None  # reason, if openscad was killed
+        self.retries = 0
+
+
+class RenderEngine:
+    def __init__(self, jobs=None, use_cache=True, backend=None, on_event=None, log_file=None, history=None,
+                 memory_limit_mb=None, timeout=None, memory_reserve_mb=None, retries=1, settle_seconds=.5):
+        """
+        :param jobs: maximum number of concurrent openscad processes, defaults to the number of cores
+        :param use_cache: take unchanged parts from the stl cache instead of rendering them again
+        :param backend: 'cgal', 'manifold' or 'auto', see render_stl.resolve_backend
+        :param on_event: function called with every event dict, default: print_event
+        :param log_file: append all events to this file, one JSON object per line
+        :param history: render_history.RenderHistory for estimates and to record renders, default: the one in the
+                        stl cache, which close() closes again
+        :param memory_limit_mb: kill openscad processes using more memory (linux only), 0 for no limit
+        :param timeout: kill openscad processes running longer than this many seconds, 0 for no limit
+        :param memory_reserve_mb: only start another process if this much memory stays available (linux only)
+        :param retries: how often a killed job is tried again, with fewer concurrent processes
+        :param settle_seconds: while pairs are streamed in, start jobs only after no pair arrived for this long
+        """
+        if jobs is None:
+            jobs = current_config().jobs
+        if jobs < 1:
+            jobs = os.cpu_count() or 1
+        self.jobs = jobs
+        self.use_cache = use_cache
+        self.backend = backend
+        self.on_event = on_event if on_event is not None else print_event
+        self.log_file = log_file
+        self._own_history = history is None
+        self.history = history if history is not None else render_history.RenderHistory()
+        config = current_config()
+        self.memory_limit_kb = 1024 * (memory_limit_mb if memory_limit_mb is not None else config.job_memory_limit_mb)
+        self.timeout = timeout if timeout is not None else config.job_timeout
+        self.memory_reserve_kb = 1024 * (memory_reserve_mb if memory_reserve_mb is not None
+                                         else config.memory_reserve_mb)
+        self.retries = retries
+        self.settle_seconds = settle_seconds
+        self.return_codes = {}  # stl_file -> openscad return code, 0 for cache hits
+        self._concurrency = jobs  # reduced whenever a job is killed
+        self._jobs = []
+        self._tasks = []
+        self._waiting = []  # jobs waiting for admission
+        self._running = []  # jobs with a running openscad process
+        self._admission = None  # asyncio.Condition, created in the event loop
+        self._streaming = False  # more pairs may arrive, see render()
+        self._last_submit = 0.
+
+    def close(self):
+        """close the render history, if the engine opened it"""
+        if self._own_history:
+            self.history.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, scad_file, stl_file):
+        """queue a render job; call from within the event loop"""
+        if self._admission is None:
+            self._admission = asyncio.Condition()
+        seconds, peak_rss_kb, _ = self.history.estimate(scad_file, render_stl.resolve_backend(self.backend))
+        job = _Job(scad_file, stl_file, seconds, peak_rss_kb)
+        self._last_submit = time.monotonic()
+        self._jobs.append(job)
+        self._waiting.append(job)
+        self._emit("queued", job)
+        self._tasks.append(asyncio.ensure_future(self._run(job)))
+
+    async def join(self):
+        """wait for all submitted jobs. :return: dict stl_file -> return code"""
+        while any(not task.done() for task in self._tasks):
+            await asyncio.gather(*self._tasks)
+        return self.return_codes
+
+    async def render(self, file_pairs):
+        """
+        Render (scad_file, stl_file) pairs and wait for all of them.
+        file_pairs can be a list, a (blocking) generator or an async generator; pairs are submitted as they arrive.
+        :return: dict stl_file -> return code
+        """
+        if isinstance(file_pairs, (list, tuple)):  # all at once, so that the most expensive one starts first
+            for scad_file, stl_file in file_pairs:
+                self.submit(scad_file, stl_file)
+        else:
+            self._streaming = True
+            try:
+                if hasattr(file_pairs, "__aiter__"):
+                    async for scad_file, stl_file in file_pairs:
+                        self.submit(scad_file, stl_file)
+                else:
+                    iterator = iter(file_pairs)
+                    while True:
+                        # next() may block until the next scad file is generated, so it runs in a thread
+                        pair = await asyncio.to_thread(next, iterator, None)
+                        if pair is None:
+                            break
+                        self.submit(*pair)
+            finally:
+                self._streaming = False
+            if self._admission is not None:
+                async with self._admission:
+                    self._admission.notify_all()
+        return await self.join()
+
+    def eta(self):
+        """estimated seconds until all submitted jobs are done"""
+        now = time.monotonic()
+        running = [max(job.estimate - (now - job.started), 0) for job in self._running]
+        waiting = [job.estimate for job in self._jobs if job.started is None and not job.done]
+        return max(max(running, default=0), (sum(running) + sum(waiting)) / self._concurrency)
+
+    async def _run(self, job):
+        backend = requested_backend = render_stl.resolve_backend(self.backend)
+        if self.use_cache:
+            key = await asyncio.to_thread(stl_cache.cache_key, job.scad_file, render_stl.path_to_openscad(), backend)
+            if await asyncio.to_thread(stl_cache.fetch, key, job.stl_file):
+                async with self._admission:
+                    self._waiting.remove(job)
+                    self._admission.notify_all()
+                self._finish(job, 0)
+                self._emit("cache-hit", job)
+                return
+
+        while True:
+            await self._admit(job)
+            try:
+                if os.path.isfile(job.stl_file):
+                    os.remove(job.stl_file)
+                return_code, seconds, output = await self._openscad(job, backend)
+                if return_code != 0 and job.killed is None and backend != "cgal":
+                    self._emit("failed", job, backend=backend, return_code=return_code, seconds=seconds,
+                               retry="cgal", **output)
+                    backend = "cgal"
+                    return_code, seconds, output = await self._openscad(job, backend)
+            finally:
+                await self._release(job)
+
+            if job.killed is None or job.retries >= self.retries:
+                break
+            # try again later, after all other waiting jobs, with fewer processes running next to it
+            self._concurrency = max(self._concurrency // 2, 1)
+            job.retries += 1
+            self._emit("killed", job, backend=backend, reason=job.killed, seconds=seconds, retry=True,
+                       concurrency=self._concurrency, **output)
+            job.killed = None
+            job.started = None
+            self._waiting.append(job)
+
+        if return_code == 0 and os.path.isfile(job.stl_file):
+            self.history.record(job.scad_file, job.stl_file, backend, time.monotonic() - job.started,
+                                job.peak_rss_kb)
+            if self.use_cache:
+                # under the key that was looked up, also if the cgal retry made it: the next build finds it there
+                await asyncio.to_thread(stl_cache.store, key, job.stl_file)
+                if backend != requested_backend:
+                    cgal_key = await asyncio.to_thread(stl_cache.cache_key, job.scad_file,
+                                                       render_stl.path_to_openscad(), backend)
+                    await asyncio.to_thread(stl_cache.store, cgal_key, job.stl_file)
+        self._finish(job, return_code)
+        details = dict(backend=backend, return_code=return_code, seconds=seconds, peak_rss_kb=job.peak_rss_kb,
+                       **output)
+        if job.killed is not None:
+            self._emit("killed", job, reason=job.killed, retry=False, **details)
+        self._emit("finished" if return_code == 0 else "failed", job, **details)
+
+    def _may_start(self, job):
+        """
+        admission control: below the concurrency limit, enough free memory for the job's estimated peak, and
+        no waiting job that fits is more expensive. Killed jobs come last.
+        """
+        if len(self._running) >= self._concurrency:
+            return False
+        if self._streaming and time.monotonic() - self._last_submit < self.settle_seconds:
+            return False  # more jobs of the same burst may follow, see settle_seconds
+        available = available_memory_kb() if self._running else None
+        still_growing = sum(max(running.expected_rss_kb - running.rss_kb, 0) for running in self._running)
+        for candidate in sorted(self._waiting, key=lambda waiting: (waiting.retries > 0, -waiting.estimate)):
+            if available is None or available - still_growing - candidate.expected_rss_kb >= self.memory_reserve_kb:
+                return candidate is job
+        return False
+
+    async def _admit(self, job):
+        async with self._admission:
+            while not self._may_start(job):
+                try:  # free memory also changes without any job finishing, so check again every second
+                    await asyncio.wait_for(self._admission.wait(), min(1, self.settle_seconds or 1))
+                except asyncio.TimeoutError:
+                    pass
+            self._waiting.remove(job)
+            self._running.append(job)
+            job.started = time.monotonic()
+            self._admission.notify_all()  # the next job in line may start as well
+
+    async def _release(self, job):
+        async with self._admission:
+            self._running.remove(job)
+            self._admission.notify_all()
+
+    async def _openscad(self, job, backend):
+        """run openscad with low cpu and io priority. :return: (return code, seconds, dict with stdout and stderr)"""
+        cmdline = render_stl.openscad_cmdline(job.scad_file, job.stl_file, backend)
+        if render_stl.os_is == 'windows':
+            priority = dict(creationflags=render_stl.IDLE_PRIORITY_CLASS)
+        else:
+            if render_stl.os_is == 'linux' and shutil.which("ionice") is not None:
+                cmdline = ["ionice", "-c", "3"] + cmdline  # ionice execs openscad in the same process
+            priority = dict(preexec_fn=render_stl.lower_priority)
+
+        self._emit("started", job, backend=backend, cmdline=subprocess.list2cmdline(cmdline))
+        start = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(*cmdline, stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.PIPE, **priority)
+        watcher = asyncio.ensure_future(self._watch(job, proc, start))
+        stdout, stderr = await proc.communicate()
+        watcher.cancel()
+        output = dict(stdout=stdout.decode(errors="replace"), stderr=stderr.decode(errors="replace"))
+        return proc.returncode, time.monotonic() - start, output
+
+    async def _watch(self, job, proc, start, interval=0.5):
+        """sample the memory of a running openscad process, and kill it if it exceeds its limits"""
+        job.rss_kb = 0
+        while proc.returncode is None:
+            rss_kb = process_rss_kb(proc.pid)
+            if rss_kb is not None:
+                job.rss_kb = rss_kb
+                job.peak_rss_kb = max(job.peak_rss_kb or 0, rss_kb)
+
+            if self.memory_limit_kb and job.rss_kb > self.memory_limit_kb:
+                job.killed = "memory limit ({:.0f} MB)".format(job.rss_kb / 1024)
+            elif self.timeout and time.monotonic() - start > self.timeout:
+                job.killed = "timeout ({:.0f} s)".format(self.timeout)
+            elif len(self._running) > 1 and job is self._running[-1]:
+                available = available_memory_kb()
+                if available is not None and available < self.memory_reserve_kb / 2:
+                    # the newest process is killed, to save the machine from swapping or the OOM killer
+                    job.killed = "low memory ({:.0f} MB available)".format(available / 1024)
+            if job.killed is not None:
+                proc.kill()
+                return
+            await asyncio.sleep(interval)
+
+    def _finish(self, job, return_code):
+        job.done = True
+        self.return_codes[job.stl_file] = return_code
+
+    def _emit(self, event, job, **details):
+        record = dict(event=event, time=time.time(), scad=job.scad_file, stl=job.stl_file, **details)
+        if any(j.started is not None for j in self._jobs):
+            record["eta"] = self.eta()
+        record["done"] = len(self.return_codes)
+        record["total"] = len(self._jobs)
+        if self.log_file is not None:
+            with open(self.log_file, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        self.on_event(record)
+
+
+def print_event(event):
+    """default event handler: one line per event, openscad warnings and errors, and the ETA"""
+    eta = "" if "eta" not in event else ", ETA {:d}:{:02d}".format(*divmod(int(event["eta"]), 60))
+    if event["event"] == "queued":
+        return
+    if event["event"] == "started":
+        print(event["cmdline"])
+    elif event["event"] == "killed":
+        print("killed {}: {}{}".format(event["stl"], event["reason"],
+                                       ", will try again with {} processes".format(event["concurrency"])
+                                       if event["retry"] else ""))
+    elif event["event"] == "cache-hit":
+        print("cache hit: {} ({}/{}){}".format(event["stl"], event["done"], event["total"], eta))
+    else:
+        for line in event["stderr"].splitlines():
+            if event["event"] == "failed" or line.startswith(("WARNING", "ERROR")):
+                print("    " + line)
+        if event.get("retry") is not None:
+            print("{} backend failed for {}, falling back to {}".format(event["backend"], event["scad"],
+                                                                         event["retry"]))
+        else:
+            print("{} {} ({}/{}) in {:.1f} s, return code {}{}".format(
+                event["event"], event["stl"], event["done"], event["total"], event["seconds"], event["return_code"],
+                eta))
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+History of all renders, and a cost model that estimates render time and memory of parts never rendered before.
+
+Every render is stored in a SQLite database in the stl cache (render_history.sqlite), with the scad file's cache key
+(see stl_cache.cache_key), the openscad backend, the resolution header, feature counts of the scad code, the render
+time and the peak memory.
+
+Features are counted in the scad code, with module bodies counted once per call:
+booleans (union, difference, intersection), hulls (hull, minkowski), cylinders, spheres, texts, polygon vertices and
+imports (pre-rendered sub-parts).
+
+For a scad file that was rendered before, the estimate is the last observed render time. Otherwise it comes from a
+non-negative least squares fit of render time over the features, of all renders with the same backend (and the same
+resolution header, if there are enough of them). The fit needs at least one render more than it has coefficients;
+before that, the estimate is proportional to the size of the scad file, so the first builds still start the largest
+parts first.
+
+    python render_history.py  # print the fitted cost model
+"""
+import heapq
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+
+import render_stl
+import stl_cache
+from config import current_config
+
+features = ("booleans", "hulls", "cylinders", "spheres", "texts", "polygon_vertices", "imports")
+seconds_per_scad_kb = .5  # estimate without a cost model: larger scad files take longer, as the first builds order them
+
+_patterns = {
+    "booleans": re.compile(r"\b(union|difference|intersection)\s*\("),
+    "hulls": re.compile(r"\b(hull|minkowski)\s*\("),
+    "cylinders": re.compile(r"\bcylinder\s*\("),
+    "spheres": re.compile(r"\bsphere\s*\("),
+    "texts": re.compile(r"\btext\s*\("),
+    "imports": re.compile(r"\bimport\s*\("),
+}
+_string = re.compile(r'"(?:[^"\\]|\\.)*"')
+_module_definition = re.compile(r"\bmodule\s+(\w+)\s*\([^)]*\)\s*\{")
+_polygon_points = re.compile(r"\bpolygon\s*\(\s*points\s*=\s*\[")
+
+
+def _matching_bracket(text, start, opening="{", closing="}"):
+    """index after the bracket that closes the one at text[start]"""
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == opening:
+            depth += 1
+        elif text[i] == closing:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return len(text)
+
+
+def _count_block(text):
+    counts = {name: len(pattern.findall(text)) for name, pattern in _patterns.items()}
+    counts["polygon_vertices"] = 0
+    for match in _polygon_points.finditer(text):
+        points = text[match.end() - 1:_matching_bracket(text, match.end() - 1, "[", "]")]
+        counts["polygon_vertices"] += points.count("[") - 1
+    return counts
+
+
+def scad_features(scad_text):
+    """:return: dict feature -> count, for the features of this module"""
+    scad_text = _string.sub('""', scad_text)  # text("{") must not confuse the brace matching
+
+    modules = {}  # module name -> body
+    main = []
+    position = 0
+    for match in _module_definition.finditer(scad_text):
+        if match.start() < position:  # nested module definition, part of the enclosing body
+            continue
+        main.append(scad_text[position:match.start()])
+        end = _matching_bracket(scad_text, match.end() - 1)
+        modules[match.group(1)] = scad_text[match.end():end - 1]
+        position = end
+    main.append(scad_text[position:])
+
+    calls = {name: re.compile(r"\b{}\s*\(".format(re.escape(name))) for name in modules}
+    totals = {}
+
+    def count(text, seen=()):
+        result = _count_block(text)
+        for name, pattern in calls.items():
+            n_calls = len(pattern.findall(text))
+            if n_calls and name not in seen:
+                if name not in totals:
+                    totals[name] = count(modules[name], seen + (name,))
+                for feature in features:
+                    result[feature] += n_calls * totals[name][feature]
+        return result
+
+    return count("".join(main))
+
+
+def scad_file_features(scad_file):
+    with open(scad_file, encoding="utf-8") as f:
+        return scad_features(f.read())
+
+
+class RenderHistory:
+    """the render database; close() it when done, or use it as a context manager: with RenderHistory() as history:"""
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(current_config().stl_cache_dir, "render_history.sqlite")
+        self.path = path
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30)  # the cache, and this file, may be shared by several builds
+        self.db.execute("CREATE TABLE IF NOT EXISTS renders (scad_hash TEXT, name TEXT, backend TEXT, header TEXT, "
+                        "openscad TEXT, {}, scad_bytes INTEGER, seconds REAL, peak_rss_kb INTEGER, rendered_at REAL)"
+                        .format(", ".join(feature + " INTEGER" for feature in features)))
+        self.db.execute("CREATE INDEX IF NOT EXISTS renders_scad_hash ON renders (scad_hash)")
+        self._models = {}  # (backend, header, column) -> coefficients or None
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, scad_file, stl_file, backend, seconds, peak_rss_kb=None):
+        """store a successful render"""
+        with open(scad_file, encoding="utf-8") as f:
+            header, _ = stl_cache.split_scad_text(f.read())
+        counts = scad_file_features(scad_file)
+        with self.db:
+            self.db.execute("INSERT INTO renders VALUES (?, ?, ?, ?, ?, {}, ?, ?, ?, ?)".format(
+                ", ".join("?" for _ in features)),
+                [stl_cache.cache_key(scad_file, render_stl.path_to_openscad(), backend), os.path.basename(stl_file),
+                 backend, header, stl_cache.openscad_version(render_stl.path_to_openscad())]
+                + [counts[feature] for feature in features]
+                + [os.path.getsize(scad_file), seconds, peak_rss_kb, time.time()])
+
+    def estimate(self, scad_file, backend):
+        """
+        estimated render time and peak memory of scad_file
+        :return: (seconds, peak_rss_kb, source) with source 'history' (rendered before), 'model' or 'scad size'
+        """
+        key = stl_cache.cache_key(scad_file, render_stl.path_to_openscad(), backend)
+        known = self.db.execute("SELECT seconds, peak_rss_kb FROM renders WHERE scad_hash = ? "
+                                "ORDER BY rendered_at DESC LIMIT 1", (key,)).fetchone()
+        if known is not None:
+            return known[0], known[1] or 0, "history"
+
+        with open(scad_file, encoding="utf-8") as f:
+            header, _ = stl_cache.split_scad_text(f.read())
+        x = self._feature_vector(scad_file_features(scad_file))
+        seconds_model = self._model(backend, header, "seconds")
+        if seconds_model is None:
+            return max(os.path.getsize(scad_file) / 1000 * seconds_per_scad_kb, 0.1), 0, "scad size"
+        rss_model = self._model(backend, header, "peak_rss_kb")
+        peak_rss_kb = 0 if rss_model is None else max(float(x @ rss_model), 0)
+        return max(float(x @ seconds_model), 0.1), peak_rss_kb, "model"
+
+    def _feature_vector(self, counts):
+        return np.array([1.] + [counts[feature] for feature in features])
+
+    def _model(self, backend, header, column):
+        """coefficients of the cost model for column, fitted to the history. None if there are too few renders."""
+        if (backend, header, column) not in self._models:
+            query = "SELECT {}, {} FROM renders WHERE backend = ? AND {} IS NOT NULL".format(
+                ", ".join(features), column, column)
+            rows = self.db.execute(query + " AND header = ?", (backend, header)).fetchall()
+            if len(rows) < 2 * len(features):  # too few renders at this resolution, use all resolutions
+                rows = self.db.execute(query, (backend,)).fetchall()
+            enough = len(rows) >= len(features) + 2  # coefficients: one per feature and the constant
+            self._models[backend, header, column] = fit_cost_model(rows) if enough else None
+        return self._models[backend, header, column]
+
+    def summary(self):
+        """text description of the history and the fitted models"""
+        lines = []
+        for backend, header, n in self.db.execute("SELECT backend, header, COUNT(*) FROM renders "
+                                                  "GROUP BY backend, header"):
+            lines.append("{} renders with {}, {}".format(n, backend, header or "no header"))
+            for column, unit in (("seconds", "s"), ("peak_rss_kb", "kB")):
+                model = self._model(backend, header, column)
+                if model is not None:
+                    terms = ["{:.3g}".format(model[0])] + ["{:.3g} * {}".format(c, feature)
+                                                           for c, feature in zip(model[1:], features) if c > 0]
+                    lines.append("    {} [{}] = {}".format(column, unit, " + ".join(terms)))
+        return "\n".join(lines)
+
+
+def fit_cost_model(rows):
+    """
+    least squares fit of the last column of rows over the other columns (plus a constant), with non-negative
+    coefficients: features with a negative coefficient are dropped and the fit is repeated.
+    :return: coefficients, constant first
+    """
+    data = np.array(rows, dtype=float)
+    x = np.hstack([np.ones((len(data), 1)), data[:, :-1]])
+    y = data[:, -1]
+    active = np.ones(x.shape[1], dtype=bool)
+    while True:
+        coefficients = np.zeros(x.shape[1])
+        coefficients[active] = np.linalg.lstsq(x[:, active], y, rcond=None)[0]
+        negative = active & (coefficients < 0)
+        if not negative.any():
+            return coefficients
+        active &= ~negative
+
+
+def predict_build(estimates, jobs):
+    """
+    wall time of rendering parts with estimated render times on `jobs` concurrent processes,
+    the most expensive first (as the render engine does)
+    """
+    workers = [0.] * max(jobs, 1)
+    for seconds in sorted(estimates, reverse=True):
+        heapq.heappush(workers, heapq.heappop(workers) + seconds)
+    return max(workers)
+
+
+def print_build_estimate(file_pairs, jobs=None, use_cache=True, backend=None):
+    """print the estimated render time of each (scad_file, stl_file) pair and of the whole build"""
+    if jobs is None:
+        jobs = current_config().jobs
+    if jobs < 1:
+        jobs = os.cpu_count() or 1
+    backend = render_stl.resolve_backend(backend)
+
+    estimates = []
+    print("{:50s} {:>10s} {:>8s}  {}".format("part", "time [s]", "RSS MB", "estimate from"))
+    with RenderHistory() as history:
+        for scad_file, stl_file in file_pairs:
+            key = stl_cache.cache_key(scad_file, render_stl.path_to_openscad(), backend)
+            if use_cache and os.path.isfile(stl_cache.cached_stl_path(key)):
+                seconds, peak_rss_kb, source = 0, 0, "stl cache"
+            else:
+                seconds, peak_rss_kb, source = history.estimate(scad_file, backend)
+            estimates.append(seconds)
+            print("{:50s} {:>10.1f} {:>8.0f}  {}".format(os.path.basename(stl_file), seconds, peak_rss_kb / 1024,
+                                                         source))
+
+    wall_time = predict_build(estimates, jobs)
+    print("total render time {:.0f} s; with {} processes, the build takes about {:d}:{:02d} (min:s)".format(
+        sum(estimates), jobs, *divmod(int(wall_time), 60)))
+    return wall_time
+
+
+if __name__ == '__main__':
+    with RenderHistory() as history:
+        print(history.summary())
@@ -6,55 +6,229 @@ Created on 09.01.2019
 
 Renders all models in /scad to /stl
 """
-import configparser
+import argparse
+import asyncio
+import functools
 import os
+import platform
+import shutil
 import subprocess
 import time
-import platform
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import export_3mf
+import render_engine
+import stl_cache
+from config import current_config, set_default_config
 
 # os_is can be 'windows', 'darwin' or 'linux'
 os_is = platform.system().lower()
 
 IDLE_PRIORITY_CLASS = 0x00000040
 
-__config = configparser.ConfigParser()
-__config.read("global_settings.ini")
-path_to_openscad = __config.get("environ", f"{os_is}_path_to_openscad", fallback="not configured")
 
+def path_to_openscad():
+    """the openscad binary of the current configuration, see global_settings.ini"""
+    return current_config().path_to_openscad
 
-def render_scad_dir_to_stl_dir(scad_dir, stl_dir):
-    if not os.path.isfile(path_to_openscad):
-        print("could not find openscad at {} - please install opensacd and edit the path in global_settings.ini".format(path_to_openscad))
+
+def render_scad_dir_to_stl_dir(scad_dir, stl_dir, jobs=None, use_cache=True, backend=None, memory_limit_mb=None,
+                               timeout=None):
+    """Render every .scad file in scad_dir to an .stl file of the same name in stl_dir.
+    :param jobs: maximum number of concurrent openscad processes, defaults to the number of cores
+    :param use_cache: take unchanged parts from the stl cache instead of rendering them again
+    :param backend: 'cgal', 'manifold' or 'auto', see resolve_backend
+    :param memory_limit_mb: kill and retry renders using more memory, see render_engine.RenderEngine
+    :param timeout: kill and retry renders taking longer, in seconds"""
+    if not os.path.isfile(path_to_openscad()):
+        print("could not find openscad at {} - please install opensacd and edit the path in global_settings.ini".format(path_to_openscad()))
         return
     files = filter(lambda f: ".scad" in f, os.listdir(scad_dir))
-    processes = []
+    file_pairs = []
     for filename in list(files):
         filepath = os.path.join(scad_dir, filename)
         outfile = filename.replace(".scad", ".stl")
         outfile = os.path.join(stl_dir, outfile)
-        print("rendering:", outfile)
-        if os.path.isfile(outfile):
-            os.remove(outfile)
-            print(outfile, "deleted")
-        cmdline = "{} -o \"{}\" \"{}\"".format(path_to_openscad, outfile, filepath)
-        print(cmdline)
-        if os_is == 'windows':  # windows path
-            proc = subprocess.Popen(cmdline, creationflags=IDLE_PRIORITY_CLASS)
-        else:                   # mac OS and linux path
-            proc = subprocess.Popen(cmdline, shell=True)
-        processes.append(proc)
-
-    while True:
-        num_running = 0
-        for proc in processes:
-            if proc.poll() is None:
-                num_running += 1
-        if num_running == 0:
-            break
-        print("waiting for {}/{} processes".format(num_running, len(processes)))
-        time.sleep(1)
-
-    print(processes[0].stderr)
+        file_pairs.append((filepath, outfile))
+
+    render_scad_files(file_pairs, jobs, use_cache, backend, memory_limit_mb=memory_limit_mb, timeout=timeout)
+
+
+def render_scad_files(file_pairs, jobs=None, use_cache=True, backend=None, log_file=None, memory_limit_mb=None,
+                      timeout=None):
+    """Render (scad_file, stl_file) pairs with at most `jobs` concurrent openscad processes.
+    The presumably longest jobs (estimated from earlier renders, see render_history) are started first, so that they
+    do not end up running alone at the end of the build.
+    :return: dict stl_file -> openscad return code"""
+    return render_scad_stream(list(file_pairs), jobs, use_cache, backend, log_file, memory_limit_mb, timeout)
+
+
+def render_scad_stream(file_pairs, jobs=None, use_cache=True, backend=None, log_file=None, memory_limit_mb=None,
+                       timeout=None):
+    """Render (scad_file, stl_file) pairs as they arrive, with at most `jobs` concurrent openscad processes.
+    file_pairs may be a generator that yields pairs while earlier ones are already rendering, e.g. as soon as
+    their scad files have been generated. Of the pairs waiting for a process, the presumably longest starts first;
+    pairs arriving together are waited for, see render_engine.RenderEngine. Blocks until all are rendered.
+    :param log_file: append the render events to this JSON lines file
+    :param memory_limit_mb: kill and retry renders using more memory (linux only), default: see global_settings.ini
+    :param timeout: kill and retry renders taking longer, in seconds, default: see global_settings.ini
+    :return: dict stl_file -> openscad return code"""
+    with render_engine.RenderEngine(jobs, use_cache, backend, log_file=log_file, memory_limit_mb=memory_limit_mb,
+                                    timeout=timeout) as engine:
+        return asyncio.run(engine.render(file_pairs))
+
+
+def _init_generation_worker(config, prerender_subparts, header):
+    """runs once in every generation process: same settings as the main process, also where processes are spawned"""
+    import parts
+    import subpart_cache  # imports this module
+
+    set_default_config(config)
+    parts.enable_memo()  # the process lives as long as the build
+    if prerender_subparts:
+        subpart_cache.enable(file_header=header)
+
+
+def generate_scad_files(tasks, header, workers=None, prerender_subparts=False):
+    """
+    Run scad generation tasks in a pool of processes, and yield (scad_file, stl_file) as soon as each one is written,
+    so that rendering can start while other parts are still being generated.
+    :param tasks: list of (stl_file or None to not render, function, args); function writes and returns a scad file
+    :param workers: number of processes, default: number of cores. 0 generates in this process (needed for profiling).
+    """
+    if workers == 0:
+        for stl_file, function, task_args in tasks:
+            scad_file = function(*task_args)
+            if stl_file is not None:
+                yield scad_file, stl_file
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_generation_worker,
+                             initargs=(current_config(), prerender_subparts, header)) as executor:
+        futures = {executor.submit(function, *task_args): stl_file for stl_file, function, task_args in tasks}
+        for future in as_completed(futures):
+            scad_file = future.result()
+            if futures[future] is not None:
+                yield scad_file, futures[future]
+
+
+def render_scad_file(scad_file, stl_file, use_cache=True, backend=None):
+    """Render a single scad file to stl with low cpu and io priority. Blocks until openscad has finished.
+    If the manifold backend fails, the file is rendered again with CGAL.
+    :return: openscad return code, 0 for cache hits"""
+    return render_scad_stream([(scad_file, stl_file)], 1, use_cache, backend)[stl_file]
+
+
+def openscad_cmdline(scad_file, stl_file, backend="cgal"):
+    return [path_to_openscad()] + supported_backends(path_to_openscad())[backend] + ["-o", stl_file, scad_file]
+
+
+def run_openscad(scad_file, stl_file, backend="cgal"):
+    """
+    Run openscad with low cpu and io priority, and wait for it.
+    :return: (return code, wall time in seconds, peak memory in kB or None if unknown)
+    """
+    cmdline = openscad_cmdline(scad_file, stl_file, backend)
+    print(subprocess.list2cmdline(cmdline))
+    start = time.perf_counter()
+    if os_is == 'windows':  # windows path
+        proc = subprocess.Popen(cmdline, creationflags=IDLE_PRIORITY_CLASS)
+        return proc.wait(), time.perf_counter() - start, None
+
+    # mac OS and linux path
+    if os_is == 'linux' and shutil.which("ionice") is not None:
+        cmdline = ["ionice", "-c", "3"] + cmdline  # idle io class; ionice execs openscad in the same process
+    proc = subprocess.Popen(cmdline, preexec_fn=lower_priority)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    peak_rss_kb = usage.ru_maxrss if os_is == 'linux' else usage.ru_maxrss // 1024  # mac OS: bytes
+    return proc.returncode, time.perf_counter() - start, peak_rss_kb
+
+
+def lower_priority():
+    """runs in the forked child before openscad starts: lowest cpu priority, like IDLE_PRIORITY_CLASS on windows"""
+    os.nice(19)
+
+
+@functools.lru_cache(maxsize=None)
+def supported_backends(path):
+    """
+    Geometry backends of the openscad binary at path.
+    Recent OpenSCAD builds select them with --backend, development snapshots from 2023/24 with --enable=manifold.
+    :return: dict backend name -> extra command line arguments
+    """
+    try:
+        result = subprocess.run([path, "--help"], capture_output=True, text=True)
+        help_text = (result.stdout + result.stderr).lower()
+    except OSError:
+        help_text = ""
+    if "--backend" in help_text:
+        return {"cgal": ["--backend=cgal"], "manifold": ["--backend=manifold"]}
+    if "manifold" in help_text:
+        return {"cgal": [], "manifold": ["--enable=manifold"]}
+    return {"cgal": []}
+
+
+def resolve_backend(backend=None):
+    """
+    :param backend: 'cgal', 'manifold' or 'auto' (manifold if available), None for the configured default backend
+    :return: backend supported by the configured openscad
+    """
+    if backend is None:
+        backend = current_config().backend
+    available = supported_backends(path_to_openscad())
+    if backend == "auto":
+        return "manifold" if "manifold" in available else "cgal"
+    if backend not in available:
+        print("openscad at {} does not support the {} backend, using cgal".format(path_to_openscad(), backend))
+        return "cgal"
+    return backend
+
+
+def stl_triangle_count(stl_file):
+    """number of triangles in an ascii or binary stl file"""
+    with open(stl_file, "rb") as f:
+        start = f.read(84)
+        if len(start) == 84:
+            n_binary = int.from_bytes(start[80:84], "little")
+            if os.path.getsize(stl_file) == 84 + 50 * n_binary:
+                return n_binary
+        f.seek(0)
+        return sum(line.lstrip().startswith(b"facet") for line in f)
+
+
+def benchmark_backends(file_pairs, backends=None):
+    """
+    Render each (scad_file, stl_file) pair with each available backend, one after the other, without the cache.
+    The backend name is added to the stl file name.
+    :return: list of dicts with file, backend, return_code, seconds, peak_rss_kb, triangles
+    """
+    if backends is None:
+        backends = list(supported_backends(path_to_openscad()))
+    results = []
+    for scad_file, stl_file in file_pairs:
+        for backend in backends:
+            backend_stl = "{} - {}.stl".format(os.path.splitext(stl_file)[0], backend)
+            if os.path.isfile(backend_stl):
+                os.remove(backend_stl)
+            return_code, seconds, peak_rss_kb = run_openscad(scad_file, backend_stl, backend)
+            triangles = stl_triangle_count(backend_stl) if return_code == 0 and os.path.isfile(backend_stl) else None
+            results.append(dict(file=os.path.basename(scad_file), backend=backend, return_code=return_code,
+                                seconds=seconds, peak_rss_kb=peak_rss_kb, triangles=triangles))
+
+    print("{:40s} {:>9s} {:>9s} {:>12s} {:>10s}".format("file", "backend", "time [s]", "peak RSS [MB]", "triangles"))
+    for result in results:
+        peak_rss = "-" if result["peak_rss_kb"] is None else "{:.0f}".format(result["peak_rss_kb"] / 1024)
+        triangles = "failed" if result["triangles"] is None else result["triangles"]
+        print("{:40s} {:>9s} {:>9.1f} {:>12s} {:>10}".format(result["file"], result["backend"], result["seconds"],
+                                                            peak_rss, triangles))
+    return results
+
+
+def export_stl_dir_to_3mf(stl_dir, path):
+    """Combine all .stl files in stl_dir into one compressed 3MF file, one object per file, named like it.
+    See export_3mf; e.g. to load all parts of the reference assembly into a slicer at once."""
+    return export_3mf.write_stl_dir_3mf(stl_dir, path)
 
 
 def print_git_info_to_dir(path):
@@ -88,4 +262,27 @@ def get_git_info(path='.'):
 
 
 if __name__ == '__main__':
-    print(get_git_info())
+    parser = argparse.ArgumentParser(description="Render all .scad files in a directory to .stl")
+    parser.add_argument("scad_dir", nargs="?", help="if omitted, only print git info")
+    parser.add_argument("stl_dir", nargs="?")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="number of concurrent openscad processes (default: number of cores)")
+    parser.add_argument("--no-cache", action="store_true", help="render all files, even if a cached stl exists")
+    parser.add_argument("--backend", choices=("auto", "cgal", "manifold"), default=None,
+                        help="openscad geometry backend (default: see global_settings.ini)")
+    parser.add_argument("--memory-limit", type=int, default=None, metavar="MB",
+                        help="kill and retry openscad processes using more memory (default: see global_settings.ini)")
+    parser.add_argument("--timeout", type=int, default=None, metavar="SECONDS",
+                        help="kill and retry openscad processes running longer (default: see global_settings.ini)")
+    parser.add_argument("--3mf", dest="output_3mf", default=None, metavar="FILE",
+                        help="also combine all STL files of stl_dir into this 3MF file, one named object per file")
+    args = parser.parse_args()
+
+    if args.scad_dir is None:
+        print(get_git_info())
+    else:
+        stl_dir = args.stl_dir if args.stl_dir is not None else args.scad_dir
+        render_scad_dir_to_stl_dir(args.scad_dir, stl_dir, jobs=args.jobs, use_cache=not args.no_cache,
+                                   backend=args.backend, memory_limit_mb=args.memory_limit, timeout=args.timeout)
+        if args.output_3mf is not None:
+            export_stl_dir_to_3mf(stl_dir, args.output_3mf)
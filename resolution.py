@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Named resolution profiles for rendering, and facet budgets for parts and primitives in the coarser ones.
+
+A profile sets OpenSCAD's $fa (maximum angle per facet) and $fs (minimum facet length) in the file header:
+- draft: coarse, renders in seconds, for checking assemblies and iterating on parts
+- review: good enough to look at
+- print: what the printed parts have always used
+
+The active profile is "resolution" of the current configuration (see config): from the [render] section of
+global_settings.ini, unless the HOLMOS_RESOLUTION environment variable, set_profile() or use_config() selects another
+one.
+
+$fa/$fs give every circle of more than ~0.2 mm diameter 72 facets in the print profile, whether it is a screw hole or
+the 80 mm cage_circumference. Primitives can pass segments=segments(d, budget) to cap the number of facets;
+with facet_budget(n), a whole part declares a cap for all primitives in it that use segments(). Budgets only apply in
+the draft and review profiles; printed parts keep the facets of $fa/$fs.
+"""
+import contextlib
+import contextvars
+import math
+
+from config import current_config, default_config, set_default_config
+
+PROFILES = {
+    "draft": {"fa": 15, "fs": 1, "budgets": True},
+    "review": {"fa": 8, "fs": 0.4, "budgets": True},
+    "print": {"fa": 5, "fs": 0.1, "budgets": False},
+}
+
+_budgets = contextvars.ContextVar("holmos_facet_budgets", default=())  # budgets of the parts currently being built
+
+
+def set_profile(name):
+    """select the resolution profile for all following scad_header() and segments() calls, in the default configuration"""
+    if name not in PROFILES:
+        raise ValueError("unknown resolution profile {}, choose one of {}".format(name, ", ".join(PROFILES)))
+    set_default_config(default_config().replace(resolution=name))
+
+
+def active_profile():
+    name = current_config().resolution
+    if name not in PROFILES:
+        raise ValueError("unknown resolution profile {}, choose one of {}".format(name, ", ".join(PROFILES)))
+    return name
+
+
+def scad_header(profile=None):
+    """scad file header setting $fa and $fs"""
+    settings = PROFILES[profile or active_profile()]
+    header = "$fa = {:g};".format(settings["fa"])  # minimum face angle
+    header += "$fs = {:g};".format(settings["fs"])  # minimum face size
+    return header
+
+
+def fragments(d, profile=None):
+    """number of facets OpenSCAD uses for a circle of diameter d with the profile's $fa and $fs"""
+    settings = PROFILES[profile or active_profile()]
+    r = d / 2
+    if r < 1e-5:  # OpenSCAD's GRID_FINE
+        return 3
+    return int(math.ceil(max(min(360 / settings["fa"], r * 2 * math.pi / settings["fs"]), 5)))
+
+
+def segments(d, budget=None):
+    """
+    $fn for a circle of diameter d, limited to budget and the budgets of the parts being built, if the active profile
+    has budgets. Use as cylinder(d=d, h=h, segments=segments(d, 32)).
+    :return: number of facets, or None if no budget applies (then $fa/$fs from the file header are used)
+    """
+    profile = active_profile()
+    budgets = [b for b in (budget,) + _budgets.get() if b is not None]
+    if not PROFILES[profile]["budgets"] or not budgets or min(budgets) >= fragments(d, profile):
+        return None
+    return max(min(budgets), 3)
+
+
+@contextlib.contextmanager
+def facet_budget(max_segments):
+    """
+    Cap the number of facets of all circles created with segments() inside, e.g. for a part:
+        @facet_budget(48)
+        def my_part(): ...
+    Nested budgets apply the smallest.
+    """
+    token = _budgets.set(_budgets.get() + (max_segments,))
+    try:
+        yield
+    finally:
+        _budgets.reset(token)
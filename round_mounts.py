@@ -5,14 +5,14 @@ Created on 08.01.2019
 @author: beckmann
 """
 import numpy
-from solid import scad_render_to_file, translate, rotate, cylinder, cube, linear_extrude, text
+from solid import translate, rotate, cylinder, cube, linear_extrude, text
 
 from base import base
-from file_tools import safe_mkdir
 from helpers import rounded_plate, cyl_arc, hexagon
-from render_stl import render_scad_dir_to_stl_dir
+from parts import printable_part
 
 
+@printable_part(lambda mount: rotate((0, 180, 0))(mount))
 def round_mount_light(inner_diam=17.9, ring_thick=3, opening_angle=30, stop_inner_diam=None, cyl_length=10,
                       clip_length=10, assemble=False):
     """
@@ -24,7 +24,7 @@ def round_mount_light(inner_diam=17.9, ring_thick=3, opening_angle=30, stop_inne
     :param stop_inner_diam: if not None, a smaller second cylinder acts as a stop, i.e. for a lens.
     :param cyl_length: Total length of cylinder (including optional stop)
     :param clip_length: Length of clip. increase for heavy objects, e.g. objective with steel housing
-    :param assemble:
+    :param assemble: upside down, optical axis at z=0 (see parts.printable_part)
     :return: Scad object
     """
     base_thick = 5
@@ -81,17 +81,13 @@ def round_mount_light(inner_diam=17.9, ring_thick=3, opening_angle=30, stop_inne
 
     base_plate += translate((0, -(20-base_thick/2), z_thick/2))(info_text)
 
-    mount = base_plate + ring + connector
+    return base_plate + ring + connector
 
-    if assemble:
-        mount = rotate((0, 180, 0))(mount)
-
-    return mount
-
-
-if __name__ == '__main__':
 
+def sweeps():
     """
+    the mounts built by the __main__ block, as sweep.Sweep (also benchmarked, see benchmark.py)
+
     https://forscherladen.lafeo.de/opti-media-achromat-2-linser-f-99-6-mm::10-550.OAL.html
     Durchmesser: 26,0 mm   # wrong; measured 24.3 mm -> 1"
     Brennweite: + 99,6 mm
@@ -100,34 +96,25 @@ if __name__ == '__main__':
     Durchmesser: 16,5 mm
     Brennweite: + 65 mm
     """
+    from sweep import Sweep
+
+    return [
+        Sweep(round_mount_light, {}, name="objective_mount_edmund4x_simple", inner_diam=20, opening_angle=None,
+              stop_inner_diam=19),
+        Sweep(round_mount_light, {}, name="objective_mount_edmund4x_plan", inner_diam=24, opening_angle=None,
+              stop_inner_diam=21),
+        Sweep(round_mount_light, {}, name="light_tube", inner_diam=20, opening_angle=0, cyl_length=40, ring_thick=2),
+        Sweep(round_mount_light, {}, name="round_5mm_LED", inner_diam=5, opening_angle=None),
+        # with stop - lenses
+        Sweep(round_mount_light, {"inner_diam": (25.4, 20, 16.5)}, filename="lens mount_d{inner_diam:.1f}",
+              opening_angle=None, derived={"stop_inner_diam": lambda p: p["inner_diam"] - 2}),
+        # without stop - lasers
+        Sweep(round_mount_light, {"inner_diam": (12, 10)}, filename="round_mount_d{inner_diam:.1f}",
+              opening_angle=None),
+    ]
 
-    header = "$fa = 5;"  # minimum face angle
-    header += "$fs = 0.1;"  # minimum face size
-
-    scad_path = "scad/misc/"
-    stl_path = "stl/misc/"
-    safe_mkdir(scad_path)
 
-    scad_render_to_file(round_mount_light(20, opening_angle=None, stop_inner_diam=19),
-                        scad_path + "objective_mount_edmund4x_simple.scad", file_header=header)
-
-    scad_render_to_file(round_mount_light(24, opening_angle=None, stop_inner_diam=21),
-                        scad_path + "objective_mount_edmund4x_plan.scad", file_header=header)
-
-    scad_render_to_file(round_mount_light(20, opening_angle=0, cyl_length=40, ring_thick=2),
-                        scad_path + "light_tube.scad", file_header=header)
-
-    scad_render_to_file(round_mount_light(5, opening_angle=None), scad_path + "round_5mm_LED.scad", file_header=header)
-
-    # with stop - lenses
-    for d in (25.4, 20, 16.5):
-        scad_render_to_file(round_mount_light(d, opening_angle=None, stop_inner_diam=d-2),
-                            scad_path + "lens mount_d{:.1f}.scad".format(d), file_header=header)
-
-    # without stop - lasers
-    for d in (12, 10):
-        scad_render_to_file(round_mount_light(d, opening_angle=None),
-                            "scad/misc/round_mount_d{:.1f}.scad".format(d), file_header=header)
+if __name__ == '__main__':
+    from sweep import build_sweeps
 
-    safe_mkdir(stl_path)
-    render_scad_dir_to_stl_dir(scad_path, stl_path)
+    build_sweeps(sweeps(), "scad/misc", "stl/misc", manifest_name="round_mounts_manifest.json")
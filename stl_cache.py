@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Local, content-addressed cache of rendered STL files.
+
+The key of a cached STL is a hash of
+- the openscad version string and geometry backend (CGAL or Manifold give different meshes),
+- the file header of the .scad file, i.e. the "$fa = 5;$fs = 0.1;" resolution settings,
+- the geometry part of the .scad file.
+The "Generated by SolidPython ... on <date>" line and the Python code that SolidPython appends as a comment do not
+change the geometry and are ignored, so regenerating an unchanged part gives a cache hit.
+
+Cache hits are hardlinked (or copied, where hardlinks are not possible) into the output directory.
+"""
+import functools
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+
+from config import current_config
+
+_generated_by_prefix = "// Generated by SolidPython"
+_python_code_marker = "\n/***********************************************\n*********      SolidPython code:"
+
+
+@functools.lru_cache(maxsize=None)
+def openscad_version(path_to_openscad):
+    """version string of the openscad binary, e.g. 'OpenSCAD version 2021.01'. Called once per binary."""
+    try:
+        result = subprocess.run([path_to_openscad, "--version"], capture_output=True, text=True)
+    except OSError:
+        return "unknown"
+    # openscad prints its version to stderr
+    return (result.stdout + result.stderr).strip()
+
+
+def split_scad_text(scad_text):
+    """
+    Split the text of a .scad file into resolution header and geometry, leaving out everything that does not change
+    the rendered geometry.
+    :return: (header, body)
+    """
+    marker_pos = scad_text.find(_python_code_marker)
+    if marker_pos >= 0:
+        scad_text = scad_text[:marker_pos]
+
+    header_lines = []
+    body_lines = []
+    for line in scad_text.splitlines():
+        if line.startswith(_generated_by_prefix):
+            continue
+        if not body_lines and line.startswith("$"):  # special variables before the first object
+            header_lines.append(line.strip())
+        elif body_lines or line.strip():
+            body_lines.append(line.rstrip())
+    return "\n".join(header_lines), "\n".join(body_lines)
+
+
+def cache_key(scad_file, path_to_openscad, backend="cgal"):
+    """content hash of scad_file, its header, the openscad version and backend"""
+    with open(scad_file, encoding="utf-8") as f:
+        header, body = split_scad_text(f.read())
+
+    sha = hashlib.sha256()
+    for label, text in (("openscad", openscad_version(path_to_openscad)), ("backend", backend),
+                        ("header", header), ("body", body)):
+        sha.update("{}:{}\n".format(label, len(text)).encode())
+        sha.update(text.encode())
+    return sha.hexdigest()
+
+
+def cache_dir():
+    """directory of the stl cache, stl_cache_dir in global_settings.ini"""
+    return current_config().stl_cache_dir
+
+
+def cached_stl_path(key):
+    return os.path.join(cache_dir(), key[:2], key + ".stl")
+
+
+def fetch(key, stl_file):
+    """
+    Put the cached STL for key at stl_file, replacing any existing file.
+    :return: True on a cache hit, False if there is no cached STL for key
+    """
+    cached = cached_stl_path(key)
+    if not os.path.isfile(cached):
+        return False
+    if os.path.isfile(stl_file):
+        os.remove(stl_file)
+    _link_or_copy(cached, stl_file)
+    return True
+
+
+def store(key, stl_file):
+    """add a freshly rendered stl_file to the cache"""
+    cached = cached_stl_path(key)
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    tmp_file = "{}.{}-{}.tmp".format(cached, os.getpid(), threading.get_ident())
+    _link_or_copy(stl_file, tmp_file)
+    os.replace(tmp_file, cached)  # atomic, in case several builds share a cache
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:  # different file systems, or no hardlink support
+        shutil.copyfile(src, dst)
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Regression check of rendered parts against the committed STL files in reference_assembly/.
+
+Every STL in the build directory is compared with the file of the same name in the reference directory, in three
+steps; the second and third only run if the hashes differ. A part is changed by the first check that finds a
+difference; the third still runs for parts changed in bounding box or volume, for the deviation in the report:
+1. hash of the normalized mesh (see stl_tools.normalize): same triangles in any order and any STL format,
+2. bounding box and volume,
+3. maximum deviation in mm: points on each surface (the vertices, and random points, one per 4 mm^2) and their
+   distance to the closest triangle of the other surface, in both directions. Candidate triangles are found through a
+   grid of 0.5 mm voxels. Points further away are first compared with the surface points of the other part, and only
+   those that may be the furthest with all its triangles, so the maximum is exact.
+
+    python stl_regression.py  # compare stl/reference_assembly with reference_assembly
+    python stl_regression.py --skip-deviation  # do not measure the deviation of parts already known to be changed
+"""
+import argparse
+import hashlib
+import os
+
+import numpy as np
+
+import stl_tools
+
+voxel_size = .5  # mm, grid of the nearest-triangle search
+samples_per_mm2 = .25
+max_samples = 100000
+
+
+def mesh_hash(triangles):
+    return hashlib.sha256(stl_tools.binary_stl_bytes(stl_tools.normalize(triangles))).hexdigest()
+
+
+def surface_points(triangles, seed=0):
+    """vertices of the mesh, plus random points on its surface, about samples_per_mm2 per mm^2"""
+    v = np.asarray(triangles, dtype=np.float64)
+    area = np.linalg.norm(np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0]), axis=1) / 2
+    n_samples = int(min(area.sum() * samples_per_mm2, max_samples))
+    rng = np.random.default_rng(seed)  # same points in every run
+    chosen = rng.choice(len(v), size=n_samples, p=area / area.sum()) if n_samples else np.zeros(0, dtype=int)
+    r1, r2 = rng.random((2, n_samples, 1))
+    r1 = np.sqrt(r1)  # uniform on the triangle
+    samples = (1 - r1) * v[chosen, 0] + r1 * (1 - r2) * v[chosen, 1] + r1 * r2 * v[chosen, 2]
+    return np.concatenate([np.unique(v.reshape(-1, 3), axis=0), samples])
+
+
+def point_triangle_distance(p, a, b, c):
+    """distance of points p to triangles (a, b, c), all arrays of shape (n, 3)"""
+    normal = np.cross(b - a, c - a)
+    normal_length = np.linalg.norm(normal, axis=1, keepdims=True)
+    unit = np.divide(normal, normal_length, out=np.zeros_like(normal), where=normal_length > 0)
+    height = np.einsum("ij,ij->i", p - a, unit)
+    projected = p - height[:, None] * unit
+    # the projection is inside if it is on the inner side of all three edges
+    inside = normal_length[:, 0] > 0
+    for start, end in ((a, b), (b, c), (c, a)):
+        inside &= np.einsum("ij,ij->i", np.cross(end - start, projected - start), normal) >= 0
+
+    def segment_distance(start, end):
+        direction = end - start
+        length2 = np.einsum("ij,ij->i", direction, direction)
+        t = np.clip(np.divide(np.einsum("ij,ij->i", p - start, direction), length2,
+                              out=np.zeros_like(length2), where=length2 > 0), 0, 1)
+        return np.linalg.norm(p - (start + t[:, None] * direction), axis=1)
+
+    edge_distance = np.minimum(np.minimum(segment_distance(a, b), segment_distance(b, c)), segment_distance(c, a))
+    return np.where(inside, np.abs(height), edge_distance)
+
+
+def _grid_distances(points, t, voxel, chunk):
+    """
+    distance of every point to the closest triangle, if that is at most `voxel` away, else inf.
+    Every triangle is listed in all voxels that its bounding box, grown by `voxel`, overlaps; a triangle within
+    `voxel` of a point is then listed in the point's voxel.
+    """
+    origin = np.minimum(t.reshape(-1, 3).min(axis=0), points.min(axis=0)) - 2 * voxel
+    low_cell = np.floor((t.min(axis=1) - voxel - origin) / voxel).astype(np.int64)
+    high_cell = np.floor((t.max(axis=1) + voxel - origin) / voxel).astype(np.int64)
+    shape = np.maximum(high_cell.max(axis=0), np.floor((points.max(axis=0) - origin) / voxel).astype(np.int64)) + 1
+
+    # one entry (voxel, triangle) for every voxel of every triangle's box
+    extent = high_cell - low_cell + 1
+    n_cells = extent.prod(axis=1)
+    triangle = np.repeat(np.arange(len(t)), n_cells)
+    k = np.arange(n_cells.sum()) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)  # number of the voxel in the box
+    ey, ez = extent[triangle, 1], extent[triangle, 2]
+    cells = low_cell[triangle] + np.stack([k // (ey * ez), (k // ez) % ey, k % ez], axis=1)
+    keys = (cells[:, 0] * shape[1] + cells[:, 1]) * shape[2] + cells[:, 2]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys, sorted_triangles = keys[order], triangle[order]
+
+    point_cells = np.floor((points - origin) / voxel).astype(np.int64)
+    point_keys = (point_cells[:, 0] * shape[1] + point_cells[:, 1]) * shape[2] + point_cells[:, 2]
+    low = np.searchsorted(sorted_keys, point_keys, side="left")
+    counts = np.searchsorted(sorted_keys, point_keys, side="right") - low
+
+    result = np.full(len(points), np.inf)
+    cumulative = np.cumsum(counts)
+    start = 0
+    while start < len(points):  # chunks of at most `chunk` point-triangle pairs
+        done = cumulative[start - 1] if start else 0
+        end = max(int(np.searchsorted(cumulative, done + chunk, side="right")), start + 1)
+        c_low, c_count = low[start:end], counts[start:end]
+        total = int(c_count.sum())
+        if total:
+            # candidates of each point: sorted_triangles[low:low + count], concatenated
+            owner = np.repeat(np.arange(start, end), c_count)
+            position = np.arange(total) + np.repeat(c_low - np.cumsum(c_count) + c_count, c_count)
+            candidates = sorted_triangles[position]
+            d = point_triangle_distance(points[owner], t[candidates, 0], t[candidates, 1], t[candidates, 2])
+            with_candidates = np.flatnonzero(c_count)
+            first = (np.cumsum(c_count) - c_count)[with_candidates]
+            result[start + with_candidates] = np.minimum.reduceat(d, first)
+        start = end
+    result[result > voxel] = np.inf
+    return result
+
+
+def _distance_to_all(points, t, chunk=2000000):
+    """distance of every point to the closest of all triangles"""
+    result = np.empty(len(points))
+    per_chunk = max(chunk // len(t), 1)
+    for start in range(0, len(points), per_chunk):
+        p = points[start:start + per_chunk]
+        owner, triangle = np.repeat(np.arange(len(p)), len(t)), np.tile(np.arange(len(t)), len(p))
+        d = point_triangle_distance(p[owner], t[triangle, 0], t[triangle, 1], t[triangle, 2])
+        result[start:start + per_chunk] = d.reshape(len(p), len(t)).min(axis=1)
+    return result
+
+
+def _distance_to_points(points, others, chunk=4000000):
+    """distance of every point to the closest of the other points, through |p - q|^2 = p^2 + q^2 - 2 p.q"""
+    result = np.empty(len(points))
+    others_squared = np.einsum("ij,ij->i", others, others)
+    per_chunk = max(chunk // len(others), 1)
+    for start in range(0, len(points), per_chunk):
+        p = points[start:start + per_chunk]
+        squared = np.einsum("ij,ij->i", p, p)[:, None] + others_squared[None, :] - 2 * p @ others.T
+        result[start:start + per_chunk] = np.sqrt(np.maximum(squared.min(axis=1), 0))
+    return result
+
+
+def distances_to_mesh(points, triangles, chunk=2000000, n_exact=256):
+    """
+    distance of every point to the closest triangle of the mesh.
+    Exact up to voxel_size. Further away, it is first the distance to the closest point of surface_points(triangles),
+    an upper bound; points whose bound exceeds the largest exact distance are then compared with all triangles,
+    n_exact at a time, so that the maximum is exact.
+    """
+    t = np.asarray(triangles, dtype=np.float64)
+    if len(t) == 0:
+        return np.full(len(points), np.inf)
+    result = _grid_distances(points, t, voxel_size, chunk)
+    far = np.flatnonzero(~np.isfinite(result))
+    if len(far):
+        result[far] = _distance_to_points(points[far], surface_points(t, seed=1))
+        far = far[np.argsort(result[far])[::-1]]  # largest upper bound first
+        exact_max = 0
+        while len(far) and result[far[0]] > exact_max:
+            largest, far = far[:n_exact], far[n_exact:]
+            result[largest] = _distance_to_all(points[largest], t, chunk)
+            exact_max = max(exact_max, result[largest].max())
+    return result
+
+
+def max_deviation(triangles_a, triangles_b):
+    """largest distance of a point on one surface to the other surface (Hausdorff distance), in mm"""
+    points_a = surface_points(triangles_a)
+    points_b = surface_points(triangles_b)
+    return float(max(distances_to_mesh(points_a, triangles_b).max(initial=0),
+                     distances_to_mesh(points_b, triangles_a).max(initial=0)))
+
+
+def compare_stl(new_file, reference_file, tolerance=0.01, report_deviation=True):
+    """
+    :param tolerance: largest difference in mm that is not a change; for the volume, the surface area times this
+    :param report_deviation: also compute the maximum deviation of parts whose bounding box or volume changed, for
+                             the report; False skips it
+    :return: dict with status ("identical", "same shape" or "changed"), and for non-identical parts the
+             differences of bounding box (mm), volume (mm^3), the maximum deviation (mm, None if not computed) and
+             changed_by, the first check that found the change ("bbox", "volume", "deviation" or None)
+    """
+    new, reference = stl_tools.read_stl(new_file), stl_tools.read_stl(reference_file)
+    if mesh_hash(new) == mesh_hash(reference):
+        return {"status": "identical"}
+
+    new_stats, reference_stats = stl_tools.mesh_stats(new), stl_tools.mesh_stats(reference)
+    bbox_difference = float(np.max(np.abs(np.concatenate([
+        np.subtract(new_stats["bbox_min"], reference_stats["bbox_min"]),
+        np.subtract(new_stats["bbox_max"], reference_stats["bbox_max"])]))))
+    volume_difference = new_stats["volume_mm3"] - reference_stats["volume_mm3"]
+    if bbox_difference > tolerance:
+        changed_by = "bbox"
+    elif abs(volume_difference) > tolerance * new_stats["area_mm2"]:
+        changed_by = "volume"
+    else:
+        changed_by = None
+    deviation = None
+    if changed_by is None or report_deviation:
+        deviation = max_deviation(new, reference)
+        if changed_by is None and deviation > tolerance:
+            changed_by = "deviation"
+    return {"status": "same shape" if changed_by is None else "changed", "changed_by": changed_by,
+            "bbox_difference_mm": bbox_difference, "volume_difference_mm3": volume_difference,
+            "max_deviation_mm": deviation}
+
+
+def compare_dirs(new_dir, reference_dir, tolerance=0.01, report_deviation=True):
+    """compare_stl() every STL file that is in either directory; status "new" or "missing" if only in one"""
+    names = {name for directory in (new_dir, reference_dir) if os.path.isdir(directory)
+             for name in os.listdir(directory) if name.lower().endswith(".stl")}
+    results = {}
+    for name in sorted(names):
+        new_file, reference_file = os.path.join(new_dir, name), os.path.join(reference_dir, name)
+        if not os.path.isfile(reference_file):
+            results[name] = {"status": "new"}
+        elif not os.path.isfile(new_file):
+            results[name] = {"status": "missing"}
+        else:
+            results[name] = compare_stl(new_file, reference_file, tolerance, report_deviation)
+    return results
+
+
+def print_report(results):
+    print("{:35s} {:12s} {:>10s} {:>12s} {:>14s}  {}".format("part", "status", "bbox mm", "volume mm3", "deviation mm",
+                                                           "changed by"))
+    for name, result in results.items():
+        if "bbox_difference_mm" in result:
+            deviation = result["max_deviation_mm"]
+            print("{:35s} {:12s} {:>10.3f} {:>+12.2f} {:>14s}  {}".format(
+                name[:35], result["status"], result["bbox_difference_mm"], result["volume_difference_mm3"],
+                "-" if deviation is None else "{:.3f}".format(deviation), result["changed_by"] or ""))
+        else:
+            print("{:35s} {}".format(name[:35], result["status"]))
+    changed = [name for name, result in results.items() if result["status"] in ("changed", "new", "missing")]
+    print("{} of {} parts changed{}".format(len(changed), len(results), ": " + ", ".join(changed) if changed else ""))
+    return changed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare rendered STL files with the committed reference STLs")
+    parser.add_argument("--new", default="stl/reference_assembly", help="directory of the rendered STLs")
+    parser.add_argument("--reference", default="reference_assembly", help="directory of the reference STLs")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="largest deviation in mm that is not a change")
+    parser.add_argument("--skip-deviation", action="store_true",
+                        help="do not compute the maximum deviation of parts whose bounding box or volume changed")
+    args = parser.parse_args()
+    exit(1 if print_report(compare_dirs(args.new, args.reference, args.tolerance, not args.skip_deviation)) else 0)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Reading, writing and normalizing STL files, and a content-addressed store for the rendered parts.
+
+openscad writes ASCII STL, about five times the size of binary STL, and the order of the triangles depends on how the
+part was built: e.g. both cage_circumference of the reference assembly have the same triangles, but different files.
+normalize() converts a mesh to a canonical form: every triangle starts at its lexicographically smallest vertex
+(keeping the orientation), the triangles are sorted, -0 becomes 0 and the normals are computed from the vertices.
+Written as binary STL, identical geometry then gives identical bytes.
+
+store_stl_dir() does this for all STL files in a directory after rendering. Each file is stored once in the artifact
+store (artifacts in the stl cache directory) by the hash of its contents, and hardlinked (or copied) to its name.
+artifacts.json in the directory maps every file name to its hash and mesh statistics.
+
+mesh_stats() computes volume, surface area, bounding box and triangle count of a mesh, whether it is watertight
+(every edge is shared by exactly two triangles, in opposite directions) and whether it fits the printer's build volume
+(bed_size_mm in global_settings.ini, also rotated by 90 degrees). Binary STLs are memory mapped, and all statistics
+are computed with numpy on whole arrays.
+
+    python stl_tools.py stl/reference_assembly  # normalize and store the STLs in these directories
+    python stl_tools.py --stats stl/reference_assembly  # only print the statistics
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+
+import stl_cache
+from config import current_config
+
+binary_header = b"holmos-hardware normalized binary STL"
+_triangle_dtype = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attributes", "<u2")])
+_ascii_vertex = re.compile(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)")
+
+
+def is_binary_stl(path):
+    """binary STL files have an 80 byte header, the triangle count, and 50 bytes per triangle"""
+    size = os.path.getsize(path)
+    if size < 84:
+        return False
+    with open(path, "rb") as f:
+        f.seek(80)
+        count = int(np.frombuffer(f.read(4), "<u4")[0])
+    return size == 84 + 50 * count
+
+
+def read_stl(path):
+    """
+    :return: triangles of the ASCII or binary STL file, float32 array of shape (n, 3 vertices, 3 coordinates).
+             For binary files, a read-only memory map of the file.
+    """
+    if is_binary_stl(path):
+        n_triangles = (os.path.getsize(path) - 84) // 50
+        if n_triangles == 0:
+            return np.zeros((0, 3, 3), dtype=np.float32)
+        return np.memmap(path, dtype=_triangle_dtype, mode="r", offset=84, shape=(n_triangles,))["vertices"]
+    with open(path, "rb") as f:
+        coordinates = _ascii_vertex.findall(f.read())
+    return np.array(coordinates, dtype=np.float64).astype(np.float32).reshape(-1, 3, 3)
+
+
+def normals(triangles):
+    """unit normals of the triangles, from their vertices (right-hand rule); 0 for degenerate triangles"""
+    v = triangles.astype(np.float64)
+    n = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+    length = np.linalg.norm(n, axis=1, keepdims=True)
+    return np.divide(n, length, out=np.zeros_like(n), where=length > 0).astype(np.float32)
+
+
+def mesh_stats(triangles, bed_size_mm=None):
+    """
+    statistics of a mesh, see the module docstring
+    :param bed_size_mm: build volume (x, y, z), default: from the configuration
+    :return: dict with triangles, volume_mm3, area_mm2, bbox_min, bbox_max, size_mm, watertight, fits_bed
+    """
+    if bed_size_mm is None:
+        bed_size_mm = current_config().bed_size_mm
+    v = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    cross = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+    volume = np.einsum("ij,ij->", v[:, 0], cross) / 6  # sum of the signed volumes of tetrahedra with the origin
+    area = np.linalg.norm(cross, axis=1).sum() / 2
+    if len(v):
+        bbox_min, bbox_max = v.min(axis=(0, 1)), v.max(axis=(0, 1))
+    else:
+        bbox_min = bbox_max = np.zeros(3)
+    size = bbox_max - bbox_min
+    bed = np.asarray(bed_size_mm, dtype=float)
+    fits_bed = bool(size[2] <= bed[2] and ((size[0] <= bed[0] and size[1] <= bed[1]) or
+                                           (size[0] <= bed[1] and size[1] <= bed[0])))
+    return {"triangles": len(v), "volume_mm3": float(volume), "area_mm2": float(area),
+            "bbox_min": bbox_min.tolist(), "bbox_max": bbox_max.tolist(), "size_mm": size.tolist(),
+            "watertight": is_watertight(triangles), "fits_bed": fits_bed}
+
+
+def is_watertight(triangles):
+    """True if every edge of the mesh is used exactly once in each direction, i.e. by two triangles of a closed,
+    consistently oriented surface"""
+    if len(triangles) == 0:
+        return False
+    vertices = np.ascontiguousarray(triangles, dtype=np.float32).reshape(-1, 3)
+    _, index = np.unique(vertices.view(np.dtype((np.void, 12))).ravel(), return_inverse=True)
+    index = index.reshape(-1, 3).astype(np.int64)
+    start, end = index.ravel(), index[:, [1, 2, 0]].ravel()
+    n = index.max() + 1
+    edges = np.sort(start * n + end)
+    if np.any(edges[1:] == edges[:-1]):  # an edge used twice in the same direction
+        return False
+    return bool(np.array_equal(edges, np.sort(end * n + start)))
+
+
+def stl_stats(path, bed_size_mm=None):
+    """mesh_stats() of an STL file"""
+    return mesh_stats(read_stl(path), bed_size_mm)
+
+
+def _lexicographically_less(a, b):
+    """for rows of vertices a and b (n, 3): a < b, comparing x, then y, then z"""
+    return (a[:, 0] < b[:, 0]) | ((a[:, 0] == b[:, 0]) & ((a[:, 1] < b[:, 1]) | ((a[:, 1] == b[:, 1]) &
+                                                                                (a[:, 2] < b[:, 2]))))
+
+
+def normalize(triangles):
+    """canonical form of a mesh: same triangles give the same array, whatever their order and starting vertex"""
+    triangles = np.asarray(triangles, dtype=np.float32) + np.float32(0)  # -0 + 0 = 0
+    rows = np.arange(len(triangles))
+    first = np.zeros(len(triangles), dtype=int)
+    for i in (1, 2):
+        first[_lexicographically_less(triangles[:, i], triangles[rows, first])] = i
+    # rotate the vertices cyclically, which keeps the orientation of the triangle
+    rotated = triangles[rows[:, None], (first[:, None] + np.arange(3)) % 3]
+    flat = rotated.reshape(-1, 9)
+    return rotated[np.lexsort(flat.T[::-1])]
+
+
+def binary_stl_bytes(triangles):
+    data = np.zeros(len(triangles), dtype=_triangle_dtype)
+    data["normal"] = normals(triangles)
+    data["vertices"] = triangles
+    header = binary_header.ljust(80, b" ")
+    return header + np.array([len(triangles)], dtype="<u4").tobytes() + data.tobytes()
+
+
+def write_binary_stl(path, triangles):
+    with open(path, "wb") as f:
+        f.write(binary_stl_bytes(triangles))
+
+
+def store_dir():
+    """directory of the artifact store, in the stl cache"""
+    return os.path.join(stl_cache.cache_dir(), "artifacts")
+
+
+def store_stl(stl_file, directory=None):
+    """
+    Normalize stl_file, add it to the artifact store, and replace stl_file by a hardlink to the stored file.
+    stl_file is replaced, not changed, so other links to it (e.g. from the stl cache) keep the old contents.
+    :return: (content hash, mesh_stats())
+    """
+    triangles = normalize(read_stl(stl_file))
+    data = binary_stl_bytes(triangles)
+    key = hashlib.sha256(data).hexdigest()
+
+    stored = os.path.join(directory or store_dir(), key[:2], key + ".stl")
+    tmp_suffix = ".{}-{}.tmp".format(os.getpid(), threading.get_ident())
+    if not os.path.isfile(stored):
+        os.makedirs(os.path.dirname(stored), exist_ok=True)
+        with open(stored + tmp_suffix, "wb") as f:
+            f.write(data)
+        os.replace(stored + tmp_suffix, stored)  # atomic, in case several builds share the store
+
+    if os.path.samefile(stored, stl_file):  # stored before; replacing a link by itself would leave the tmp link
+        return key, mesh_stats(triangles)
+    try:
+        os.link(stored, stl_file + tmp_suffix)
+    except OSError:  # different file systems, or no hardlink support
+        shutil.copyfile(stored, stl_file + tmp_suffix)
+    os.replace(stl_file + tmp_suffix, stl_file)
+    return key, mesh_stats(triangles)
+
+
+def store_stl_dir(stl_dir, directory=None):
+    """
+    store_stl() every STL file in stl_dir, and write stl_dir/artifacts.json
+    :return: dict file name -> {"sha256": ..., and the mesh_stats()}
+    """
+    artifacts = {}
+    size_before = size_after = 0
+    for name in sorted(os.listdir(stl_dir)):
+        stl_file = os.path.join(stl_dir, name)
+        if not name.lower().endswith(".stl") or not os.path.isfile(stl_file):
+            continue
+        size_before += os.path.getsize(stl_file)
+        key, stats = store_stl(stl_file, directory)
+        size_after += os.path.getsize(stl_file)
+        artifacts[name] = dict(sha256=key, **stats)
+
+    with open(os.path.join(stl_dir, "artifacts.json"), "w") as f:
+        json.dump(artifacts, f, indent=1, sort_keys=True)
+    n_unique = len({artifact["sha256"] for artifact in artifacts.values()})
+    for name, artifact in artifacts.items():
+        if not artifact["watertight"] or not artifact["fits_bed"]:
+            print("warning: {} is {}".format(name, " and ".join(
+                problem for problem, ok in (("not watertight", artifact["watertight"]),
+                                            ("too large for the printer", artifact["fits_bed"])) if not ok)))
+    print("stored {} STL files ({} different) from {}: {:.1f} MB -> {:.1f} MB".format(
+        len(artifacts), n_unique, stl_dir, size_before / 1e6, size_after / 1e6))
+    return artifacts
+
+
+def print_stats(stl_dir):
+    print("{:35s} {:>9s} {:>10s} {:>10s} {:>22s}  {:10s} {}".format(
+        "part", "triangles", "volume cm3", "area cm2", "size mm", "watertight", "fits bed"))
+    for name in sorted(os.listdir(stl_dir)):
+        if name.lower().endswith(".stl"):
+            stats = stl_stats(os.path.join(stl_dir, name))
+            print("{:35s} {:>9d} {:>10.2f} {:>10.2f} {:>22s}  {:10s} {}".format(
+                name[:35], stats["triangles"], stats["volume_mm3"] / 1e3, stats["area_mm2"] / 1e2,
+                " x ".join("{:.1f}".format(size) for size in stats["size_mm"]),
+                str(stats["watertight"]), stats["fits_bed"]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert the STL files in directories to normalized binary STL, and "
+                                                 "add them to the artifact store")
+    parser.add_argument("stl_dirs", nargs="+")
+    parser.add_argument("--stats", action="store_true", help="only print the mesh statistics of the STL files")
+    parser.add_argument("--store", default=None, help="directory of the artifact store (default: in the stl cache)")
+    args = parser.parse_args()
+    for stl_dir in args.stl_dirs:
+        if args.stats:
+            print_stats(stl_dir)
+        else:
+            store_stl_dir(stl_dir, args.store)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Pre-rendered sub-parts.
+
+The rod clamps (base.single_rod_clamp, base.base_rods30) and cage.cage_3_clips are part of almost every printable
+part, and without this, each openscad process evaluates their booleans again.
+When enabled, functions decorated with @prerendered render their geometry once to an STL in the stl cache, and return
+an import() of that STL instead of the CSG tree. The STL's name contains a hash of the function's arguments
+(e.g. z_length and tightness) and the geometry settings of the current configuration (see config), and of the rendered
+scad code, so changing any of them renders a new STL.
+
+The imported mesh is a finished solid, so holes (hole()) of the sub-part, e.g. the rod bores of the clamps, would only
+cut the sub-part itself. They must also cut the part it is added to, so the import is returned together with the
+sub-part's hole() nodes, in their places (see hole_tree), and the final part is the same as with the CSG sub-part.
+"""
+import copy
+import functools
+import hashlib
+import inspect
+import os
+import threading
+import warnings
+
+from solid import import_, union
+
+import render_stl
+import stl_cache
+from config import current_config
+from csg_tools import write_scad
+
+_enabled = False
+_file_header = ""
+_state = threading.local()  # building: currently building a sub-part's CSG, do not import nested sub-parts
+
+
+def enable(file_header="", enabled=True):
+    """
+    Use pre-rendered STLs for all @prerendered functions from now on.
+    :param file_header: scad file header for rendering the sub-parts, i.e. the same resolution as the final parts
+    """
+    global _enabled, _file_header
+    _enabled = enabled
+    _file_header = file_header
+
+
+def prerendered(func):
+    """decorator for sub-part functions that can be replaced by an import() of their rendered STL"""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled or getattr(_state, "building", False):
+            return func(*args, **kwargs)
+
+        _state.building = True
+        try:
+            obj = func(*args, **kwargs)
+        finally:
+            _state.building = False
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        stl_file = _render_subpart(func.__name__, bound.arguments, obj)
+        if stl_file is None:
+            return obj
+        imported = import_(os.path.abspath(stl_file).replace("\\", "/"))
+        holes = hole_tree(obj)
+        return imported if holes is None else union()(imported, holes)
+
+    return wrapper
+
+
+def _has_holes(node):
+    return any(child.is_hole or (not child.is_part_root and _has_holes(child)) for child in node.children)
+
+
+def hole_tree(obj):
+    """
+    the hole() nodes of obj, with the transforms above them, or None if there are none. As when solidpython renders
+    the holes, intersections and differences above holes become unions.
+    """
+    if not _has_holes(obj):
+        return None
+    node = union() if obj.name in ("intersection", "difference") else copy.copy(obj)
+    node.children = []
+    node.params = dict(obj.params)
+    node.parent = None
+    for child in obj.children:
+        if child.is_hole:
+            node.add(child.copy())
+        elif not child.is_part_root:
+            holes = hole_tree(child)
+            if holes is not None:
+                node.add(holes)
+    return node
+
+
+def _render_subpart(name, arguments, obj):
+    """render obj to the sub-part cache, if not yet there. Returns the stl path, or None if rendering failed."""
+    if not os.path.isfile(render_stl.path_to_openscad()):
+        warnings.warn("openscad not found, cannot pre-render {}".format(name))
+        return None
+
+    subpart_dir = os.path.join(stl_cache.cache_dir(), "subparts")
+    os.makedirs(subpart_dir, exist_ok=True)
+    settings = current_config().geometry_settings()
+    args_hash = hashlib.sha256(repr((sorted(arguments.items()), sorted(settings.items()))).encode()).hexdigest()
+    scad_file = os.path.join(subpart_dir, "{}-{}.scad".format(name, args_hash[:16]))
+    # written and rendered under temporary names: parts generated in parallel processes may need the same sub-part
+    tmp_suffix = ".{}-{}".format(os.getpid(), threading.get_ident())
+    os.replace(write_scad(obj, scad_file + tmp_suffix, file_header=_file_header), scad_file)
+
+    key = stl_cache.cache_key(scad_file, render_stl.path_to_openscad(), render_stl.resolve_backend())
+    stl_file = os.path.join(subpart_dir, "{}-{}-{}.stl".format(name, args_hash[:16], key[:16]))
+    if os.path.isfile(stl_file):
+        return stl_file
+
+    tmp_file = stl_file[:-4] + tmp_suffix + ".stl"
+    if render_stl.render_scad_file(scad_file, tmp_file) != 0 or not os.path.isfile(tmp_file):
+        warnings.warn("could not pre-render {}, using CSG instead".format(name))
+        return None
+    os.replace(tmp_file, stl_file)
+    return stl_file
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Created on 17.10.2026
+
+Parameter sweeps: build every combination of parameter values of a part function.
+
+    lenses = Sweep(round_mount_light, {"inner_diam": (25.4, 20, 16.5)}, name="lens_mount", opening_angle=None,
+                   derived={"stop_inner_diam": lambda p: p["inner_diam"] - 2})
+    build_sweeps([lenses], "scad/misc", "stl/misc")
+
+The grid maps parameter names to lists of values; the sweep has one variant per element of their product.
+Parameters that are settings of the configuration (see config.HolmosConfig, e.g. rods30_tightness or resolution)
+are applied with config.use_config, all others are passed to the part function.
+
+The scad files of all variants are generated in parallel processes, and each one is rendered (through the stl cache)
+as soon as it is written. Variants with identical geometry, e.g. because a parameter has no effect, are rendered once
+and share the STL file. manifest.json in the stl directory maps the parameters of every variant to its STL.
+"""
+import hashlib
+import itertools
+import json
+import os
+
+import render_stl
+import resolution
+import stl_cache
+from config import current_config, use_config
+from csg_tools import write_scad
+from file_tools import safe_mkdir
+
+
+class Sweep:
+    def __init__(self, part_func, grid, name=None, derived=None, filename=None, **fixed):
+        """
+        :param part_func: function returning the part
+        :param grid: dict parameter name -> list of values
+        :param name: start of the file names, default: name of part_func
+        :param derived: dict parameter name -> function(variant parameters) returning the value
+        :param filename: file name of the variants (without extension), formatted with their fixed and grid
+                         parameters, e.g. "lens mount_d{inner_diam:.1f}"; default: name and the grid values
+        :param fixed: parameters that are the same for all variants
+        """
+        self.part_func = part_func
+        self.grid = dict(grid)
+        self.name = name if name is not None else part_func.__name__
+        self.filename = filename
+        self.derived = derived or {}
+        self.fixed = fixed
+
+    def points(self):
+        """list of dicts parameter name -> value, one per variant"""
+        names = list(self.grid)
+        return [dict(zip(names, values)) for values in itertools.product(*self.grid.values())]
+
+    def variant_name(self, point):
+        if self.filename is not None:
+            return self.filename.format(**dict(self.fixed, **point))
+        if not point:
+            return self.name
+        return "{}_{}".format(self.name, "_".join("{}={}".format(key, _format_value(value))
+                                                  for key, value in point.items()))
+
+    def variant_arguments(self, point):
+        """:return: (keyword arguments of part_func, changes to the configuration) of one variant"""
+        arguments = dict(self.fixed, **point)
+        for key, function in self.derived.items():
+            arguments[key] = function(point)
+        settings = vars(current_config())
+        kwargs = {key: value for key, value in arguments.items() if key not in settings}
+        config_changes = {key: value for key, value in arguments.items() if key in settings}
+        return kwargs, config_changes
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        value = "{:g}".format(value)
+    return "".join(c if c.isalnum() or c in ".-" else "-" for c in str(value))
+
+
+def write_variant_scad(part_func, kwargs, config_changes, scad_file, optimize=False):
+    """write part_func(**kwargs), built with the configuration changed by config_changes, to scad_file"""
+    with use_config(current_config().replace(**config_changes)):
+        write_scad(part_func(**kwargs), scad_file, file_header=resolution.scad_header(), optimize=optimize)
+    print("generated", scad_file)
+    return scad_file
+
+
+def geometry_hash(scad_file):
+    """hash of the parts of scad_file that change the rendered geometry, see stl_cache.split_scad_text"""
+    with open(scad_file, encoding="utf-8") as f:
+        header, body = stl_cache.split_scad_text(f.read())
+    return hashlib.sha256("{}\n{}".format(header, body).encode()).hexdigest()
+
+
+def build_sweeps(sweeps, scad_path, stl_path, jobs=None, use_cache=True, backend=None, generation_workers=None,
+                 optimize=False, render=True, log_file=None, manifest_name="manifest.json"):
+    """
+    Generate and render all variants of the sweeps, and write the manifest to stl_path.
+    :param generation_workers: processes for scad generation, see render_stl.generate_scad_files
+    :param render: False only generates the scad files (as does a missing openscad)
+    :param manifest_name: file name of the manifest, e.g. to keep the manifests of several builds to one directory
+    :return: the manifest, a dict
+    """
+    safe_mkdir(scad_path, stl_path)
+    manifest = {"sweeps": []}
+    tasks = []
+    for sweep in sweeps:
+        variants = []
+        for point in sweep.points():
+            kwargs, config_changes = sweep.variant_arguments(point)
+            filename = sweep.variant_name(point)
+            scad_file = os.path.join(scad_path, filename + ".scad")
+            stl_file = os.path.join(stl_path, filename + ".stl")
+            tasks.append((stl_file, write_variant_scad, (sweep.part_func, kwargs, config_changes, scad_file, optimize)))
+            variants.append({"parameters": point, "scad": scad_file, "stl": stl_file})
+        manifest["sweeps"].append({"name": sweep.name,
+                                   "part": sweep.part_func.__name__,
+                                   "grid": list(sweep.grid), "fixed": sweep.fixed, "variants": variants})
+
+    stl_of_geometry = {}  # geometry hash -> stl file of the first variant with this geometry
+    same_as = {}  # stl file -> stl file of an identical variant
+
+    def unique_file_pairs():
+        for scad_file, stl_file in render_stl.generate_scad_files(tasks, resolution.scad_header(), generation_workers):
+            key = geometry_hash(scad_file)
+            if key in stl_of_geometry:
+                print("same geometry as {}: {}".format(os.path.basename(stl_of_geometry[key]), scad_file))
+                same_as[stl_file] = stl_of_geometry[key]
+            else:
+                stl_of_geometry[key] = stl_file
+                yield scad_file, stl_file
+
+    return_codes = {}
+    if render and os.path.isfile(render_stl.path_to_openscad()):
+        return_codes = render_stl.render_scad_stream(unique_file_pairs(), jobs, use_cache, backend, log_file)
+    else:
+        list(unique_file_pairs())
+
+    for entry in manifest["sweeps"]:
+        for variant in entry["variants"]:
+            stl_file = same_as.get(variant["stl"], variant["stl"])
+            variant["stl"] = os.path.relpath(stl_file, stl_path) if render and return_codes.get(stl_file) == 0 else None
+            variant["scad"] = os.path.relpath(variant["scad"], stl_path)
+    with open(os.path.join(stl_path, manifest_name), "w") as f:
+        json.dump(manifest, f, indent=1, default=repr)
+    print("{} variants, {} different geometries".format(len(tasks), len(stl_of_geometry)))
+    return manifest
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""optimize_csg must not change the geometry: the scad code of both trees is evaluated at sample points"""
+import re
+
+import numpy as np
+import pytest
+from solid import cube, cylinder, difference, hole, part, rotate, scad_render, sphere, translate, union
+
+import csg_bounds
+import csg_tools
+from csg_tools import affine_matrix, optimize_csg
+
+_token = re.compile(r'\s*(?:(/\*.*?\*/)|("(?:[^"\\]|\\.)*")|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|'
+                    r'([$\w]+)|(.))', re.S)
+
+
+class _Node:
+    def __init__(self, name, params, modifier):
+        self.name, self.params, self.modifier, self.children = name, params, modifier, []
+
+
+def _tokens(scad_code):
+    for match in _token.finditer(scad_code):
+        comment, string, number, word, symbol = match.groups()
+        if comment is None and match.group().strip():
+            yield string if string is not None else float(number) if number is not None else word or symbol
+
+
+def _value(tokens):
+    token = next(tokens)
+    if token == "[":
+        values = []
+        while True:
+            values.append(_value(tokens))
+            if next(tokens) == "]":
+                return values
+    return {"true": True, "false": False, "undef": None}.get(token, token)
+
+
+def parse_scad(scad_code):
+    """the nodes of scad code as written by solidpython (no modules), below a union"""
+    tokens = _tokens(scad_code)
+    root = _Node("union", {}, "")
+    stack = [root]
+    for token in tokens:
+        if token == "}":
+            stack.pop()
+            continue
+        modifier = ""
+        while token in ("#", "%", "*", "!"):
+            modifier, token = modifier + token, next(tokens)
+        assert next(tokens) == "("
+        params, separator = {}, next(tokens)
+        while separator != ")":
+            assert next(tokens) == "="
+            params[separator] = _value(tokens)
+            separator = next(tokens)
+            if separator == ",":
+                separator = next(tokens)
+        node = _Node(token, params, modifier)
+        stack[-1].children.append(node)
+        if next(tokens) == "{":
+            stack.append(node)
+    return root
+
+
+def inside(node, points):
+    """True for the points inside the node's geometry; 2D shapes are extruded infinitely along z"""
+    if "*" in node.modifier or "%" in node.modifier:
+        return np.zeros(len(points), dtype=bool)
+    matrix = affine_matrix(node)
+    if matrix is not None:
+        moved = np.hstack([points, np.ones((len(points), 1))]) @ np.linalg.inv(matrix).T
+        points = moved[:, :3]
+    children = [inside(child, points) for child in node.children]
+    x, y, z = points.T
+    params = node.params
+    if node.name == "difference":
+        return children[0] & ~np.any(children[1:], axis=0) if children else np.zeros(len(points), dtype=bool)
+    if node.name == "intersection":
+        return np.all(children, axis=0)
+    if node.children or matrix is not None or node.name in ("union", "color", "render"):
+        if node.name == "linear_extrude":
+            assert not params.get("twist") and params.get("scale") in (None, 1)
+            h = params["height"]
+            z_range = (z >= -h / 2) & (z <= h / 2) if params.get("center") else (z >= 0) & (z <= h)
+            return np.any(children, axis=0) & z_range
+        assert matrix is not None or node.name in ("union", "color", "render"), node.name
+        return np.any(children, axis=0) if children else np.zeros(len(points), dtype=bool)
+    if node.name == "cube":
+        box = csg_bounds._cube(params)
+        return np.all((points >= box[0]) & (points <= box[1]), axis=1)
+    if node.name == "cylinder":
+        h = float(params.get("h") or 1)
+        radius = csg_bounds._radius(params)
+        radius = 1. if radius is None else radius
+        r1, r2 = csg_bounds._radius(params, "r1", "d1"), csg_bounds._radius(params, "r2", "d2")
+        r1, r2 = radius if r1 is None else r1, radius if r2 is None else r2
+        z = z + h / 2 if params.get("center") else z
+        return (z >= 0) & (z <= h) & (x ** 2 + y ** 2 <= (r1 + (r2 - r1) * z / h) ** 2)
+    if node.name == "sphere":
+        radius = csg_bounds._radius(params)
+        return np.sum(points ** 2, axis=1) <= (1. if radius is None else radius) ** 2
+    if node.name == "circle":
+        radius = csg_bounds._radius(params)
+        return x ** 2 + y ** 2 <= (1. if radius is None else radius) ** 2
+    if node.name == "polygon":
+        polygon = np.array(params["points"], dtype=float)
+        result = np.zeros(len(points), dtype=bool)
+        for (x1, y1), (x2, y2) in zip(polygon, np.roll(polygon, -1, axis=0)):
+            crosses = (y1 > y) != (y2 > y)
+            result ^= crosses & (x < (x2 - x1) * (y - y1) / np.where(crosses, y2 - y1, 1) + x1)
+        return result
+    if node.name in ("square", "text"):  # text: its estimated box, the same in both trees
+        box = csg_bounds._primitives[node.name](params)
+        return np.all((points[:, :2] >= box[0, :2]) & (points[:, :2] <= box[1, :2]), axis=1)
+    raise ValueError("no geometry for {}()".format(node.name))
+
+
+def assert_same_geometry(obj, n_points=20000):
+    optimized = optimize_csg(obj)
+    box = csg_bounds.bounds(obj)
+    assert np.allclose(csg_bounds.bounds(optimized), box)
+    points = np.random.default_rng(1).uniform(box[0] - 1, box[1] + 1, (n_points, 3))
+    expected = inside(parse_scad(scad_render(obj)), points)
+    assert expected.any() and not expected.all()
+    assert np.array_equal(inside(parse_scad(scad_render(optimized)), points), expected)
+    # written with shared modules, the optimized tree renders the same
+    assert np.array_equal(inside(parse_scad(scad_render(optimized)), points),
+                          inside(parse_scad(_without_modules(csg_tools.scad_render_shared(optimized))), points))
+
+
+def _without_modules(scad_code):
+    """scad code with the module calls replaced by the module bodies"""
+    modules = {}
+    for match in list(re.finditer(r"\nmodule (\w+)\(\) \{", scad_code)):
+        end, depth = match.end(), 1
+        while depth:
+            depth += {"{": 1, "}": -1}.get(scad_code[end], 0)
+            end += 1
+        modules[match.group(1)] = scad_code[match.end():end - 1]
+    scad_code = re.sub(r"\nmodule (\w+)\(\) \{", "", scad_code[scad_code.rfind("\n}\n") + 3:]) if modules \
+        else scad_code
+    while any(name + "();" in scad_code for name in modules):
+        for name, body in modules.items():
+            scad_code = scad_code.replace(name + "();", "union() {" + body + "}")
+    return scad_code
+
+
+def test_transforms_with_holes_and_parts():
+    screw = hole()(translate((0, 0, -1))(rotate((0, 0, 30))(cylinder(d=3, h=12))))
+    plate = cube((40, 30, 10))
+    for x in (5, 15, 25, 35):
+        plate -= translate((x, 0, 0))(translate((0, 8, 0))(rotate((0, 0, 90))(rotate((0, 0, -90))(
+            cylinder(d=4, h=30, center=True)))))
+    plate += translate((5, 20, 0))(translate((0, 0, 0))(screw))
+    insert = part()(translate((20, 15, 5))(rotate((0, 90, 0))(union()(sphere(4), hole()(cube(3, center=True))))))
+    mount = union()(union()(plate, rotate((0, 0, 0))(insert)), translate((0, 0, 10))(translate((10, 10, 0))(screw)))
+    assert_same_geometry(mount)
+    assert_same_geometry(part()(mount))
+    assert_same_geometry(difference()(mount, translate((20, 0, 0))(cube(8))))
+
+
+@pytest.mark.parametrize("number", range(11))
+def test_reference_parts(number):
+    import parts
+    from reference_assembly import part_list
+
+    component = part_list[number]
+    with parts.build_scope():
+        for assemble in (False, True):
+            assert_same_geometry(component.part_func(assemble=assemble, **component.kwargs))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+import interference
+
+
+def _box(low, high):
+    """closed triangle mesh of an axis-aligned box"""
+    corners = np.array([[x, y, z] for x in (low[0], high[0]) for y in (low[1], high[1]) for z in (low[2], high[2])],
+                       dtype=float)
+    faces = [(0, 1, 3), (0, 3, 2), (4, 6, 7), (4, 7, 5), (0, 4, 5), (0, 5, 1),
+             (2, 3, 7), (2, 7, 6), (0, 2, 6), (0, 6, 4), (1, 5, 7), (1, 7, 3)]
+    return corners[np.array(faces)]
+
+
+def test_points_inside():
+    inside = interference.points_inside(_box((0, 0, 0), (10, 10, 10)), [(5, 5, 5), (1, 9, 2), (11, 5, 5), (5, 5, -1)])
+    assert inside.tolist() == [True, True, False, False]
+
+
+def test_mesh_inside():
+    outer = _box((0, 0, 0), (10, 10, 10))
+    assert interference.mesh_inside(_box((2, 2, 2), (8, 8, 8)), outer)
+    assert not interference.mesh_inside(outer, _box((2, 2, 2), (8, 8, 8)))
+    assert not interference.mesh_inside(_box((10, 0, 0), (20, 10, 10)), outer)  # touching
+
+
+def test_mesh_intersections():
+    outer = _box((0, 0, 0), (10, 10, 10))
+    assert interference.mesh_intersections(_box((5, 5, 5), (15, 15, 15)), outer)[0] > 0
+    assert interference.mesh_intersections(_box((2, 2, 2), (8, 8, 8)), outer)[0] == 0
+    assert interference.mesh_intersections(_box((10, 0, 0), (20, 10, 10)), outer)[0] == 0
+
+
+def test_exit_codes():
+    region = np.zeros((2, 3))
+    clear = {"parts": ("a", "b"), "envelope_overlap": region, "intersections": 0, "region": None, "inside": None}
+    unchecked = {"parts": ("a", "c"), "envelope_overlap": region, "skipped": "no STL"}
+    envelope = {"parts": ("a", "d"), "envelope_overlap": region, "skipped": "envelopes only"}
+    inside = dict(clear, inside="a", region=region)
+    assert interference.print_report([clear]) == 0
+    assert interference.print_report([clear, unchecked]) == 2
+    assert interference.print_report([inside, unchecked]) == 1
+    assert interference.print_report([envelope, envelope]) == 0
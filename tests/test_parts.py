@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from solid import scad_render, translate
+
+import cage
+import parts
+from reference_assembly import holmos_full_assembly
+
+
+def test_memoized_part_renders_like_a_new_one():
+    expected = scad_render(cage.cage_circumference())
+    with parts.build_scope():
+        first = cage.cage_circumference()
+        assert scad_render(first) == expected
+        assert scad_render(cage.cage_circumference()) == expected
+
+
+def test_wrapping_a_memoized_part_keeps_its_holes():
+    expected = scad_render(cage.cage_circumference())
+    assert "Holes Below" in expected
+    with parts.build_scope():
+        translate((0, 0, 10))(cage.cage_circumference())
+        translate((0, 0, 20))(cage.cage_circumference(assemble=True))
+        holmos_full_assembly()
+        assert scad_render(cage.cage_circumference()) == expected
+
+
+def test_memoized_assembly_is_unchanged():
+    expected = scad_render(holmos_full_assembly())
+    with parts.build_scope():
+        assert scad_render(holmos_full_assembly()) == expected
+        assert scad_render(holmos_full_assembly()) == expected
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from solid import scad_render
+
+import base
+import cage
+import resolution
+from config import current_config, use_config
+
+
+def test_budgets_only_in_coarse_profiles():
+    with use_config(current_config().replace(resolution="print")):
+        assert resolution.segments(80, 32) is None
+        assert "$fn" not in scad_render(base.sunk_hole(r=10))
+    with use_config(current_config().replace(resolution="review")):
+        assert resolution.segments(80, 32) == 32
+        assert "$fn = 32" in scad_render(base.sunk_hole(r=10))
+
+
+def test_part_budget():
+    with use_config(current_config().replace(resolution="print")):
+        assert "$fn" not in scad_render(cage.cage_circumference())
+    with use_config(current_config().replace(resolution="review")):
+        with resolution.facet_budget(24):
+            assert resolution.segments(80) == 24
+            assert resolution.segments(80, 16) == 16
+        assert resolution.segments(80) is None
+        scad = scad_render(cage.cage_circumference())
+        assert "cylinder($fn = 32, d = 80.5000000000, h = 10);" in scad
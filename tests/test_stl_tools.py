@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+import os
+
+import numpy as np
+
+import stl_tools
+
+
+def test_store_twice(tmp_path):
+    output, store = tmp_path / "stl", tmp_path / "store"
+    output.mkdir()
+    stl_file = str(output / "tetrahedron.stl")
+    a, b, c, d = np.array([[0, 0, 0], [10, 0, 0], [0, 10, 0], [0, 0, 10]], dtype=np.float32)
+    stl_tools.write_binary_stl(stl_file, np.array([[a, c, b], [a, b, d], [a, d, c], [b, c, d]]))
+
+    first = stl_tools.store_stl(stl_file, str(store))
+    listing = sorted(os.listdir(output))
+    assert stl_tools.store_stl(stl_file, str(store))[0] == first[0]
+    assert sorted(os.listdir(output)) == listing == ["tetrahedron.stl"]
+    assert os.path.samefile(stl_file, os.path.join(store, first[0][:2], first[0] + ".stl"))
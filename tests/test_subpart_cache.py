@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from solid import cube, scad_render
+
+import cage
+import subpart_cache
+
+
+def _hole_lines(scad_code):
+    """the lines of the subtracted holes, without the union()s that only group them"""
+    holes = scad_code[scad_code.index("/* Holes Below*/"):]
+    return sorted(line.strip() for line in holes.splitlines() if line.strip() not in ("union(){", "union() {", "}"))
+
+
+def test_prerendered_subparts_keep_their_holes(monkeypatch):
+    expected = _hole_lines(scad_render(cage.cage_circumference()))
+    monkeypatch.setattr(subpart_cache, "_render_subpart", lambda name, arguments, obj: "/tmp/{}.stl".format(name))
+    subpart_cache.enable()
+    try:
+        prerendered = scad_render(cage.cage_circumference())
+    finally:
+        subpart_cache.enable(enabled=False)
+    assert 'import(file = "/tmp/cage_3_clips.stl"' in prerendered
+    assert _hole_lines(prerendered) == expected
+
+
+def test_hole_tree_without_holes():
+    assert subpart_cache.hole_tree(cube(1)) is None